@@ -2,25 +2,42 @@
 # -*- coding: utf-8 -*-
 
 import os
+import sys
 import json
-import csv
-import math
+import queue
+import argparse
+import functools
 import threading
 import warnings
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk, scrolledtext
 
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
 from PIL import Image, ImageTk
 
+try:
+    import tifffile as _TT
+    HAS_TIFFILE = True
+except Exception:
+    HAS_TIFFILE = False
+
+try:
+    import orjson
+    HAS_ORJSON = True
+except Exception:
+    HAS_ORJSON = False
+
 # Safety: allow very large images; silence DecompressionBomb & tifffile user warnings
 Image.MAX_IMAGE_PIXELS = None
 warnings.simplefilter("ignore", Image.DecompressionBombWarning)
 warnings.filterwarnings("ignore", category=UserWarning, module="tifffile")
 
 # split/merge helpers
-from app.splitter import split_large_image
-from app.merger import _scan_tiles, _estimate_canvas_size
+from app.splitter import (split_large_image, NORMALIZE_MODES, _normalize_to_uint8, _array_to_image,
+                          _numba_minmax_ok, _minmax_bands_u8, _contiguous_slice)
+from app.merger import _scan_tiles_cached, _estimate_canvas_size, merge_tiles, merge_tiles_from_manifest
 
 # help loader (fallback to static string if module missing)
 try:
@@ -42,71 +59,190 @@ INPUT_FILTER = [
 ]
 
 
-# ------------------------- Tooltip helper -------------------------
-class Tooltip:
-    """Small tooltip popover for any Tk widget."""
+# ------------------------- Theme presets -------------------------
+# mode -> (bg, fg, subbg, accent)
+_THEME_COLORS = {
+    "Dark": ("#1f232a", "#e6e6e6", "#272c34", "#3a82f7"),
+    "Light": ("#ffffff", "#111", "#f3f4f6", "#0b5ed7"),
+    "System": ("#f8f9fb", "#111", "#ffffff", "#0b5ed7"),
+}
 
-    def __init__(self, widget, text, delay=600, wraplength=360):
-        self.widget = widget
-        self.text = text
-        self.delay = delay
-        self.wraplength = wraplength
-        self._id = None
-        self._tip = None
-        self.widget.bind("<Enter>", self._schedule)
-        self.widget.bind("<Leave>", self._hide)
-        self.widget.bind("<ButtonPress>", self._hide)
 
-    def _schedule(self, _event=None):
-        self._unschedule()
-        self._id = self.widget.after(self.delay, self._show)
+def _theme_config(mode: str) -> dict:
+    """ttk theme_settings() spec for one color preset."""
+    bg, fg, subbg, acc = _THEME_COLORS[mode]
+    cfg = {
+        elem: {"configure": {"background": subbg if "Label" in elem else bg, "foreground": fg}}
+        for elem in ("TFrame", "TLabelframe", "TLabelframe.Label", "TLabel", "TNotebook", "TScrollbar")
+    }
+    cfg["TButton"] = {"configure": {"background": subbg, "foreground": fg},
+                      "map": {"background": [("active", acc)]}}
+    cfg["Status.TLabel"] = {"configure": {"foreground": "#666" if mode != "Dark" else "#aab"}}
+    return cfg
 
-    def _unschedule(self):
-        if self._id:
-            self.widget.after_cancel(self._id)
-            self._id = None
 
-    def _show(self):
-        if self._tip or not self.text:
+_THEME_CONFIGS = {mode: _theme_config(mode) for mode in _THEME_COLORS}
+
+
+# ------------------------- Tooltip helper -------------------------
+class _SharedTooltip:
+    """
+    One tooltip window per Tk root, reused by every Tooltip: showing a tip only
+    retexts and moves it (withdraw/deiconify instead of create/destroy).
+    """
+
+    _by_root = {}
+
+    @classmethod
+    def for_widget(cls, widget) -> "_SharedTooltip":
+        root = widget.winfo_toplevel().nametowidget(".")
+        shared = cls._by_root.get(root)
+        if shared is None:
+            shared = cls._by_root[root] = cls(root)
+        return shared
+
+    def __init__(self, root):
+        self.root = root
+        self._id = None
+        self._owner = None
+        self._tip = None
+        self._label = None
+
+    def _ensure_window(self):
+        if self._tip is not None and self._tip.winfo_exists():
             return
-        x = self.widget.winfo_rootx() + 12
-        y = self.widget.winfo_rooty() + self.widget.winfo_height() + 8
-        self._tip = tk.Toplevel(self.widget)
+        self._tip = tk.Toplevel(self.root)
+        self._tip.withdraw()
         self._tip.wm_overrideredirect(True)
-        self._tip.wm_geometry(f"+{x}+{y}")
-        label = tk.Label(
+        self._label = tk.Label(
             self._tip,
-            text=self.text,
             justify="left",
             relief="solid",
             borderwidth=1,
-            wraplength=self.wraplength,
             background="#ffffe0",
             font=("Segoe UI", 9),
         )
-        label.pack(ipadx=8, ipady=6)
+        self._label.pack(ipadx=8, ipady=6)
+
+    def schedule(self, owner: "Tooltip"):
+        self.hide()
+        self._owner = owner
+        self._id = self.root.after(owner.delay, self._show)
+
+    def _show(self):
+        self._id = None
+        owner = self._owner
+        if owner is None or not owner.text or not owner.widget.winfo_exists():
+            return
+        self._ensure_window()
+        x = owner.widget.winfo_rootx() + 12
+        y = owner.widget.winfo_rooty() + owner.widget.winfo_height() + 8
+        self._label.config(text=owner.text, wraplength=owner.wraplength)
+        self._tip.wm_geometry(f"+{x}+{y}")
+        self._tip.deiconify()
+        self._tip.lift()
+
+    def hide(self, owner: "Tooltip" = None):
+        if owner is not None and owner is not self._owner:
+            return
+        if self._id:
+            self.root.after_cancel(self._id)
+            self._id = None
+        self._owner = None
+        if self._tip is not None and self._tip.winfo_exists():
+            self._tip.withdraw()
+
+
+class Tooltip:
+    """Small tooltip popover for any Tk widget (all tooltips share one window)."""
+
+    def __init__(self, widget, text, delay=600, wraplength=360):
+        self.widget = widget
+        self.text = text
+        self.delay = delay
+        self.wraplength = wraplength
+        self._shared = _SharedTooltip.for_widget(widget)
+        self.widget.bind("<Enter>", self._schedule)
+        self.widget.bind("<Leave>", self._hide)
+        self.widget.bind("<ButtonPress>", self._hide)
+
+    def _schedule(self, _event=None):
+        self._shared.schedule(self)
 
     def _hide(self, _event=None):
-        self._unschedule()
-        if self._tip:
-            self._tip.destroy()
-            self._tip = None
+        self._shared.hide(self)
 
 
 # ------------------------- Progress dialog (with Cancel) -------------------------
+class _UiQueue:
+    """
+    Hands callables from worker threads to the Tk thread. Tk isn't thread-safe (even
+    after() from a worker is a Tcl call), so workers only put() into a queue that a
+    poller, started on the Tk thread, drains every _POLL_MS. One per Tk root.
+    """
+
+    _POLL_MS = 33  # ~30 Hz: also the cap on progress refreshes
+    _by_root = {}
+
+    @classmethod
+    def for_root(cls, master) -> "_UiQueue":
+        """Get (or create and start) the root's queue. Create it from the Tk thread."""
+        root = master.nametowidget(".")
+        ui = cls._by_root.get(root)
+        if ui is None:
+            ui = cls._by_root[root] = cls(root)
+        return ui
+
+    def __init__(self, root):
+        self.root = root
+        self._q = queue.SimpleQueue()
+        self.root.after(self._POLL_MS, self._drain)
+
+    def post(self, fn):
+        """Run fn() on the Tk thread at the next poll. Safe from any thread."""
+        self._q.put(fn)
+
+    def _drain(self):
+        try:
+            # reschedule first: a callback may open a modal dialog (nested event loop)
+            self.root.after(self._POLL_MS, self._drain)
+        except tk.TclError:
+            return  # root destroyed
+        while True:
+            try:
+                fn = self._q.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                fn()
+            except Exception:
+                self.root.report_callback_exception(*sys.exc_info())
+
+
 class ProgressDialog:
     """Modal progress dialog with Cancel button and thread-safe updates."""
 
+    _size = None  # (w, h) requested by the dialog layout, measured by the first dialog
+
     def __init__(self, master: tk.Tk, title="Working...", determinate=True):
         self.master = master
+        self._ui = _UiQueue.for_root(master)
         self.top = tk.Toplevel(master)
         self.top.title(title)
         self.top.resizable(False, False)
         self.top.transient(master)
         self.top.grab_set()
         self._total = 0
+        self._tot_str = "0"  # str(_total), built once per set_total, not per refresh
         self._value = 0
+        self._shown_value = None  # value currently on the bar/counter
         self.cancelled = False
+        # step()/set_message() coalescing: worker threads update state under the lock; at most one
+        # UI refresh is queued at a time, so refreshes run at most once per _UiQueue poll
+        self._lock = threading.Lock()
+        self._pending = False
+        self._msg_text = None
+        self._label = None  # step(label=...): message rendered as "label (value/total)" per refresh
 
         frm = ttk.Frame(self.top, padding=12)
         frm.pack(fill="both", expand=True)
@@ -130,42 +266,82 @@ class ProgressDialog:
         if not determinate:
             self.bar.start(8)
 
-        # center on parent
-        self.top.update_idletasks()
-        w = self.top.winfo_width()
-        h = self.top.winfo_height()
+        # center on parent. The layout is the same every time, so its size is measured once
+        # (update_idletasks forces a synchronous layout pass) and reused for later dialogs.
+        if ProgressDialog._size is None:
+            self.top.update_idletasks()
+            ProgressDialog._size = (self.top.winfo_reqwidth(), self.top.winfo_reqheight())
+        w, h = ProgressDialog._size
         x = master.winfo_rootx() + (master.winfo_width() - w) // 2
         y = master.winfo_rooty() + (master.winfo_height() - h) // 2
         self.top.geometry(f"+{max(0, x)}+{max(0, y)}")
 
     def _on_cancel(self):
         self.cancelled = True
+        with self._lock:
+            self._label = None  # keep the cancel notice; later step(label=...) calls don't replace it
         self.set_message("Cancelling… please wait")
 
     def set_message(self, text: str):
-        self.master.after(0, lambda: self.msg.config(text=text))
+        with self._lock:
+            self._msg_text = text  # only the latest text is shown
+            self._request_flush_locked()
 
     def set_total(self, n: int):
-        def _apply():
+        with self._lock:
             self._total = max(1, int(n))
+            self._tot_str = str(self._total)
             self._value = 0
-            self.bar.configure(mode="determinate", maximum=self._total, value=0)
-            self.counter.config(text="0 / {}".format(self._total))
-        self.master.after(0, _apply)
+            self._shown_value = 0
 
-    def step(self, inc: int = 1):
         def _apply():
-            self._value += inc
-            self.bar.configure(value=self._value)
-            self.counter.config(text="{} / {}".format(min(self._value, self._total), self._total))
-        self.master.after(0, _apply)
+            self.bar.configure(mode="determinate", maximum=self._total, value=0)
+            self.counter.config(text=f"0 / {self._tot_str}")
+        self._ui.post(_apply)
+
+    def step(self, inc: int = 1, label=None):
+        """
+        Advance the bar by inc. With label, the message also shows "label (value/total)";
+        it is formatted once per UI refresh, not once per call.
+        """
+        with self._lock:
+            # saturate here so refreshes needn't clamp
+            self._value = min(self._value + inc, self._total)
+            if label is not None and not self.cancelled:
+                self._label = label
+            self._request_flush_locked()
+
+    def _request_flush_locked(self):
+        # caller holds self._lock
+        if self._pending:
+            return  # the queued refresh will pick up the new value/text
+        self._pending = True
+        self._ui.post(self._flush_step)
+
+    def _flush_step(self):
+        with self._lock:
+            self._pending = False
+            value, tot_str = self._value, self._tot_str
+            changed = value != self._shown_value
+            self._shown_value = value
+            text, self._msg_text = self._msg_text, None
+            if changed and self._label is not None:
+                text = f"{self._label} ({value}/{tot_str})"
+        try:
+            if changed:  # a message-only refresh leaves the bar and counter alone
+                self.bar.configure(value=value)
+                self.counter.config(text=f"{value} / {tot_str}")
+            if text is not None:
+                self.msg.config(text=text)
+        except tk.TclError:
+            pass  # dialog already closed
 
     def set_indeterminate(self):
         def _apply():
             self.bar.configure(mode="indeterminate", maximum=100, value=0)
             self.bar.start(8)
             self.counter.config(text="")
-        self.master.after(0, _apply)
+        self._ui.post(_apply)
 
     def close(self):
         def _apply():
@@ -174,40 +350,300 @@ class ProgressDialog:
             except Exception:
                 pass
             self.top.destroy()
-        self.master.after(0, _apply)
+        self._ui.post(_apply)
 
 
 # ------------------------- Quick probe (H,W,C) -------------------------
+# band count per PIL mode; getbands() only for modes not listed here
+_MODE_BANDS = {
+    "1": 1, "L": 1, "P": 1, "I": 1, "F": 1,
+    "I;16": 1, "I;16B": 1, "I;16L": 1, "I;16N": 1,
+    "LA": 2, "La": 2, "PA": 2,
+    "RGB": 3, "YCbCr": 3, "LAB": 3, "HSV": 3,
+    "RGBA": 4, "RGBa": 4, "RGBX": 4, "CMYK": 4,
+}
+
+
+def _probe_tiff_shape(path: str):
+    """(H, W, C) of a TIFF's first series from its IFD header, or None if not 2-D image-like."""
+    with _TT.TiffFile(path) as tf:
+        series = tf.series[0]
+        axes, shape = series.axes, series.shape
+    if "Y" not in axes or "X" not in axes:
+        return None
+    c = 1
+    for ax in ("S", "C"):
+        if ax in axes:
+            c = shape[axes.index(ax)]
+            break
+    return int(shape[axes.index("Y")]), int(shape[axes.index("X")]), int(c)
+
+
 def _probe_image_info_fast(path: str):
     """Return (H, W, C) by reading metadata only (no full pixel load)."""
+    if HAS_TIFFILE and path.lower().endswith((".tif", ".tiff")):
+        # tifffile sees multi-band (>4 samples) and planar TIFFs that PIL misreports or rejects
+        try:
+            info = _probe_tiff_shape(path)
+            if info is not None:
+                return info
+        except Exception:
+            pass
     try:
         with Image.open(path) as im:
             w, h = im.size
-            try:
-                c = len(im.getbands()) if im.getbands() else 1
-            except Exception:
-                c = 1
+            c = _MODE_BANDS.get(im.mode)
+            if c is None:
+                try:
+                    c = len(im.getbands()) or 1
+                except Exception:
+                    c = 1
             return int(h), int(w), int(c)
     except Exception as e:
         raise ValueError(f"Could not read image metadata: {e}")
 
 
-def _save_kwargs_for_ext(ext: str) -> dict:
-    ext = (ext or "").lower()
-    if not ext.startswith("."):
-        ext = "." + ext
-    if ext in (".jpg", ".jpeg"):
-        return {"quality": 95, "optimize": True}
-    if ext in (".tif", ".tiff"):
-        return {"compression": "tiff_lzw"}
-    return {}
+@functools.lru_cache(maxsize=128)
+def _probe_cached(path: str, mtime_ns: int, size: int):
+    # mtime/size are part of the key only, so an edited file is probed again
+    return _probe_image_info_fast(path)
+
+
+def _probe_image_info(path: str):
+    """_probe_image_info_fast, memoized per (path, mtime, size)."""
+    try:
+        st = os.stat(path)
+    except OSError as e:
+        raise ValueError(f"Could not read image metadata: {e}")
+    return _probe_cached(path, st.st_mtime_ns, st.st_size)
+
+
+def _tile_grid_shape(H: int, W: int, tile: int, overlap_pct: float) -> tuple:
+    """
+    (rows, cols) of tiles split_large_image cuts (same stepping), by arithmetic: no
+    origin arrays, so small tiles on a huge scene cost nothing.
+    """
+    overlap_px = int(round(tile * overlap_pct / 100.0))
+    step = tile if overlap_px <= 0 else max(1, tile - overlap_px)
+    return len(range(0, H, step)), len(range(0, W, step))
+
+
+def _read_tiff_tiles_region(fh, page, tile: int) -> np.ndarray:
+    """Decode just the (contiguous, 2-D) TIFF tiles overlapping [0:tile, 0:tile]."""
+    H, W = page.imagelength, page.imagewidth
+    th, tw = page.tilelength, page.tilewidth
+    h, w = min(H, tile), min(W, tile)
+    spp = page.samplesperpixel
+    out = np.empty((h, w) if spp == 1 else (h, w, spp), dtype=page.dtype)
+    tiles_across = -(-W // tw)
+    for ty in range(-(-h // th)):
+        for tx in range(-(-w // tw)):
+            i = ty * tiles_across + tx
+            data = None
+            if page.databytecounts[i]:
+                fh.seek(page.dataoffsets[i])
+                data = fh.read(page.databytecounts[i])
+            seg, (_, _, y0, x0, _), _ = page.decode(data, i, jpegtables=page.jpegtables)
+            seg = seg[0] if spp > 1 else seg[0, ..., 0]
+            y1, x1 = min(h, y0 + th), min(w, x0 + tw)
+            out[y0:y1, x0:x1] = seg[:y1 - y0, :x1 - x0]
+    return out
+
+
+def _read_preview_crop(path: str, tile: int, max_side: int = 512):
+    """
+    Top-left tile x tile region, decoding as little of the file as possible.
+    Uncompressed TIFFs are memory-mapped and sliced (returns ndarray, H x W[ x C]);
+    compressed tiled TIFFs (COG-style) decode only the TIFF tiles that cover the region.
+    JPEGs use draft() so libjpeg decodes at reduced scale when the tile will be
+    shown smaller than max_side anyway. Non-interlaced PNGs get their decode extents
+    clamped to the first `tile` rows, so zlib stops there instead of inflating every
+    IDAT. Everything else: PIL crop (returns Image).
+    """
+    if HAS_TIFFILE and path.lower().endswith((".tif", ".tiff")):
+        try:
+            with _TT.TiffFile(path) as tf:
+                page = tf.pages[0]
+                axes = tf.series[0].axes
+                if not page.is_memmappable:
+                    if page.is_tiled and axes in ("YX", "YXS") and page.planarconfig == 1 \
+                            and page.imagedepth == 1:
+                        return _read_tiff_tiles_region(tf.filehandle, page, tile)
+                    axes = None
+            if axes in ("YX", "YXS", "SYX"):
+                mm = _TT.memmap(path, series=0, mode="r")
+                if axes == "SYX":
+                    mm = np.moveaxis(mm, 0, -1)
+                # hand over the mapped view: _preview_array_to_image makes the one copy
+                # (band gather / normalization / detach), instead of copying here and again there
+                return mm[:tile, :tile]
+        except Exception:
+            pass  # fall back to PIL
+
+    im = Image.open(path)
+    try:
+        out = _crop_first_tile(im, tile, max_side)
+    except BaseException:
+        im.close()
+        raise
+    if out is not im:
+        im.close()
+    return out
+
+
+def _crop_first_tile(im: Image.Image, tile: int, max_side: int) -> Image.Image:
+    """PIL part of _read_preview_crop. Returns `im` itself (loaded) when the tile covers it."""
+    w0, h0 = im.size
+    cw, ch = min(w0, tile), min(h0, tile)
+    if (im.format == "PNG" and h0 > tile and not im.info.get("interlace")
+            and len(im.tile) == 1 and im.tile[0][1] == (0, 0, w0, h0)):
+        # rows are full width in the zlib stream, so only the height can be cut
+        im.tile = [im.tile[0]._replace(extents=(0, 0, w0, tile))]
+        im._size = (w0, tile)
+    elif im.format == "JPEG" and tile > max_side:
+        f = max_side / tile
+        im.draft(im.mode, (max(1, int(w0 * f)), max(1, int(h0 * f))))
+        # draft may have shrunk the image; crop the same area at the new scale
+        cw = max(1, round(cw * im.width / w0))
+        ch = max(1, round(ch * im.height / h0))
+    if (cw, ch) == im.size and getattr(im, "n_frames", 1) == 1:
+        # tile covers the whole (decoded) image: skip crop()'s copy. Single-frame
+        # images close their file after load(), so returning im leaks nothing.
+        im.load()
+        return im
+    return im.crop((0, 0, cw, ch))
+
+
+_take_local = threading.local()  # per-thread gather buffer (T1/T2 previews decode in parallel)
+
+
+def _take_buffer(shape, dtype) -> np.ndarray:
+    """Scratch array for np.take(out=...), reused across previews on the same thread."""
+    buf = getattr(_take_local, "buf", None)
+    if buf is None or buf.shape != shape or buf.dtype != dtype:
+        buf = _take_local.buf = np.empty(shape, dtype=dtype)
+    return buf
+
+
+def _preview_array_to_image(arr: np.ndarray, sel, norm: str = "minmax") -> Image.Image:
+    """Band selection + per-channel normalization to uint8 (norm: a splitter normalize_mode), for arrays PIL can't show as-is."""
+    if norm == "global_minmax":
+        norm = "minmax"  # the preview is one tile: its own range stands in for the scene's
+    idx = None  # source channel per output channel, trimmed to a count PIL can show
+    if arr.ndim == 3:
+        idx = list(sel) if sel is not None and arr.shape[2] >= max(sel) + 1 else list(range(arr.shape[2]))
+        if len(idx) not in (3, 4):
+            idx = idx[:3] if len(idx) > 3 else idx[:1]
+
+    if norm == "minmax" and arr.dtype != np.uint8 and _numba_minmax_ok(arr):
+        # fused select + normalize (the splitter's kernel), no intermediate arrays
+        src = arr if arr.ndim == 3 else arr[:, :, None]
+        out = _minmax_bands_u8(src, np.asarray(idx or [0], dtype=np.intp))
+        return _array_to_image(out if out.shape[2] > 1 else out[:, :, 0])
+
+    if idx is not None:
+        sl = _contiguous_slice(idx)
+        if len(idx) == 1:
+            arr = arr[:, :, idx[0]]
+        elif sl is not None:
+            arr = arr[:, :, sl]  # consecutive bands: a view, no gather
+        else:
+            # gather straight into one buffer (indices already validated -> 'clip' is free).
+            # Non-uint8 data is normalized into a new array below, so the gather target is
+            # scratch and can be reused; uint8 goes to PIL as-is and needs its own.
+            shape = arr.shape[:2] + (len(idx),)
+            out = (np.empty(shape, dtype=arr.dtype) if arr.dtype == np.uint8
+                   else _take_buffer(shape, arr.dtype))
+            arr = np.take(arr, idx, axis=2, out=out, mode="clip")
+    # normalization
+    if arr.dtype != np.uint8:
+        # the splitter's own normalization, so the preview shows the bytes a tile gets
+        arr = _normalize_to_uint8(arr, norm)
+    elif isinstance(arr, np.memmap):
+        # uint8 needs no normalization; one C-ordered copy detaches it from the file
+        arr = np.array(arr, order="C")
+    return _array_to_image(arr)
+
+
+_TK_MODES = ("1", "L", "RGB", "RGBA")  # modes ImageTk blits without converting
+
+
+def _to_tk_mode(im: Image.Image, norm: str = "minmax") -> Image.Image:
+    """
+    Bring a preview image into a mode Tk takes as-is, here on the worker thread,
+    rather than inside PhotoImage/paste on the UI thread. Deep modes (I;16, I, F)
+    are normalized like array previews (Tk's own conversion would clip them).
+    """
+    if im.mode in _TK_MODES:
+        return im
+    if im.mode in ("I", "F") or im.mode.startswith("I;16"):
+        return _preview_array_to_image(np.asarray(im), None, norm)
+    return im.convert("RGBA" if "A" in im.getbands() or "transparency" in im.info else "RGB")
+
+
+def _build_preview(path: str, tile: int, sel, max_side: int = 512, norm: str = "minmax") -> Image.Image:
+    """First tile of `path` with band selection + normalization applied, shrunk to fit max_side. Thread-safe (no Tk)."""
+    crop = _read_preview_crop(path, tile, max_side)
+    if isinstance(crop, np.ndarray):
+        crop = _preview_array_to_image(crop, sel, norm)
+    else:
+        try:
+            parts = crop.split()
+            if sel is not None and len(parts) >= max(sel) + 1:
+                parts_sel = tuple(parts[i] for i in sel)
+                if len(parts_sel) == 1:
+                    crop = parts_sel[0]
+                elif len(parts_sel) == 3:
+                    crop = Image.merge("RGB", parts_sel[:3])
+                elif len(parts_sel) == 4:
+                    crop = Image.merge("RGBA", parts_sel[:4])
+        except Exception:
+            crop = _preview_array_to_image(np.asarray(crop), sel, norm)
+    crop = _to_tk_mode(crop, norm)
+
+    side = max(crop.size)
+    if side > max_side:
+        size = (max(1, crop.width * max_side // side), max(1, crop.height * max_side // side))
+        # largest power-of-two shrink that still leaves >= max_side px (bit_length guess, then fix up)
+        k = max(0, side.bit_length() - max_side.bit_length())
+        while k and (side >> k) < max_side:
+            k -= 1
+        if k:
+            # box reduce first (cheap, exact area average), then a small BOX fix-up
+            try:
+                crop = crop.reduce(1 << k)
+            except ValueError:
+                pass  # modes reduce() doesn't support
+            crop = crop.resize(size, Image.Resampling.BOX)
+        else:
+            crop = crop.resize(size, Image.BILINEAR)
+    return crop
+
+
+@functools.lru_cache(maxsize=8)  # a few band combinations of the current file
+def _preview_cached(path: str, mtime_ns: int, size: int, tile: int, sel, max_side: int, norm: str) -> Image.Image:
+    # mtime/size are part of the key only, so an edited file is decoded again
+    return _build_preview(path, tile, list(sel) if sel is not None else None, max_side, norm)
+
+
+def _build_preview_cached(path: str, tile: int, sel, max_side: int = 512, norm: str = "minmax") -> Image.Image:
+    """
+    _build_preview, memoized per (file identity, tile, bands, max_side, norm): clicking Preview
+    again with unchanged settings shows the already-decoded tile. The returned image is
+    shared; treat it as read-only.
+    """
+    st = os.stat(path)
+    return _preview_cached(path, st.st_mtime_ns, st.st_size, tile,
+                           tuple(sel) if sel is not None else None, max_side, norm)
 
 
 # ------------------------- Main App -------------------------
 class ImagePrepApp(ttk.Frame):
-    def __init__(self, master):
+    def __init__(self, master, no_dialog: bool = False):
         super().__init__(master)
         self.master: tk.Tk = master
+        self.no_dialog = no_dialog
+        self._ui = _UiQueue.for_root(master)  # created here, on the Tk thread
         self.master.title(f"{APP_TITLE} — {APP_VERSION}")
         self.master.geometry("1120x800")
         self.master.minsize(1040, 720)
@@ -222,6 +658,7 @@ class ImagePrepApp(ttk.Frame):
         self.tile_size = tk.IntVar(value=512)
         self.overlap_pct = tk.DoubleVar(value=0.0)
         self.extension = tk.StringVar(value=".png")
+        self.normalize_mode = tk.StringVar(value="minmax")
 
         # Optional base names for T1/T2
         self.t1_base = tk.StringVar(value="")
@@ -229,21 +666,37 @@ class ImagePrepApp(ttk.Frame):
 
         self.name_pattern = tk.StringVar(value="{base}_tile_{y}_{x}")
         self.selected_bands_vars = []
+        # pooled band checkbuttons (widget, var); the first _bands_shown are gridded.
+        # _bands_dirty: _band_mask changed size but the checkboxes weren't re-rendered yet
+        # (that waits until the Bands box is on screen)
+        self._band_widgets = []
+        self._bands_shown = 0
+        self._bands_dirty = False
+        # mirror of the visible checkboxes, kept in sync by their command= callbacks, so
+        # _selected_bands never has to read Tk variables (safe from worker threads)
+        self._band_mask = np.zeros(0, dtype=bool)
 
         # Training metadata
         self.scene_id = tk.StringVar(value="")
         self.fold = tk.StringVar(value="train")
         self.label_path = tk.StringVar()
         self.write_parquet = tk.BooleanVar(value=False)
+        self.skip_constant = tk.BooleanVar(value=False)
 
         # Merge
         self.tiles_dir = tk.StringVar()
         self.merge_out_path = tk.StringVar()
         self.merge_fold_var = tk.StringVar(value="")
+        self.write_pyramid = tk.BooleanVar(value=False)
 
         # Theme
         self.theme_var = tk.StringVar(value="System")
 
+        # Settings persistence: debounced snapshot, written by a background thread
+        self._settings_lock = threading.Lock()
+        self._settings_pending = None
+        self._settings_on_disk = None  # bytes of SETTINGS_FILE as last read / written (under the lock)
+
         # Layout
         self._build_root_layout()
         self._create_pages()
@@ -262,19 +715,10 @@ class ImagePrepApp(ttk.Frame):
         self._apply_theme_colors("System")
 
     def _apply_theme_colors(self, mode: str):
-        if mode == "Dark":
-            bg = "#1f232a"; fg = "#e6e6e6"; subbg = "#272c34"; acc = "#3a82f7"
-        elif mode == "Light":
-            bg = "#ffffff"; fg = "#111"; subbg = "#f3f4f6"; acc = "#0b5ed7"
-        else:
-            bg = "#f8f9fb"; fg = "#111"; subbg = "#ffffff"; acc = "#0b5ed7"
-
-        self.master.configure(bg=bg)
-        for elem in ("TFrame", "TLabelframe", "TLabelframe.Label", "TLabel", "TNotebook", "TScrollbar"):
-            self.style.configure(elem, background=subbg if "Label" in elem else bg, foreground=fg)
-        self.style.configure("TButton", background=subbg, foreground=fg)
-        self.style.map("TButton", background=[("active", acc)])
-        self.style.configure("Status.TLabel", foreground="#666" if mode != "Dark" else "#aab")
+        cfg = _THEME_CONFIGS.get(mode, _THEME_CONFIGS["System"])
+        self.master.configure(bg=_THEME_COLORS.get(mode, _THEME_COLORS["System"])[0])
+        # one theme_settings call applies every configure/map in a single batch
+        self.style.theme_settings(self.style.theme_use(), cfg)
 
     # ---------------- Root Layout ----------------
     def _build_root_layout(self):
@@ -314,6 +758,8 @@ class ImagePrepApp(ttk.Frame):
         self.status.pack(side="left", fill="x", expand=True)
 
     def _show_page(self, name: str):
+        if name not in self.pages:
+            self.pages[name] = self._page_builders[name](self.content)
         for _, f in self.pages.items():
             f.pack_forget()
         self.pages[name].pack(fill="both", expand=True)
@@ -321,10 +767,16 @@ class ImagePrepApp(ttk.Frame):
 
     # ---------------- Pages ----------------
     def _create_pages(self):
+        # pages are built on first _show_page; widgets on a page are only reached from
+        # that page's own buttons, and all Tk variables already exist in __init__
+        self._page_builders = {
+            "split": self._build_split_page,
+            "merge": self._build_merge_page,
+            "preview": self._build_preview_page,
+            "help": self._build_help_page,
+        }
+        # split is the start page and owns the band checkboxes _load_settings fills
         self.pages["split"] = self._build_split_page(self.content)
-        self.pages["merge"] = self._build_merge_page(self.content)
-        self.pages["preview"] = self._build_preview_page(self.content)
-        self.pages["help"] = self._build_help_page(self.content)
 
     # ---------------- Split Page ----------------
     def _build_split_page(self, parent):
@@ -375,6 +827,19 @@ class ImagePrepApp(ttk.Frame):
         fmt_combo.grid(row=0, column=5, sticky="w", padx=6, pady=6)
         Tooltip(fmt_combo, "File format for tiles (.png / .jpg / .tif / .tiff / .jpeg).")
 
+        ttk.Label(tiling, text="Normalize:").grid(row=1, column=4, sticky="w", padx=6, pady=6)
+        norm_combo = ttk.Combobox(tiling, textvariable=self.normalize_mode, values=NORMALIZE_MODES,
+                                  state="readonly", width=13)
+        norm_combo.grid(row=1, column=5, sticky="w", padx=6, pady=6)
+        Tooltip(
+            norm_combo,
+            "How non-8-bit data is scaled to 0..255 (8-bit input is kept as-is):\n"
+            "minmax: per-band min..max\n"
+            "global_minmax: per-band min..max of the whole image (same scale in every tile)\n"
+            "percentile: per-band 2nd..98th percentile, outliers clipped\n"
+            "clip: values taken as-is, clipped to 0..255"
+        )
+
         # Base names for T1/T2
         ttk.Label(tiling, text="Base (T1):").grid(row=1, column=0, sticky="e", padx=6, pady=6)
         t1base_entry = ttk.Entry(tiling, textvariable=self.t1_base, width=28)
@@ -395,14 +860,26 @@ class ImagePrepApp(ttk.Frame):
             "Example: {base}_tile_{y}_{x}\n"
             "Tip: merge-from-folder expects {y} and {x} in the name."
         )
+
+        skip_chk = ttk.Checkbutton(tiling, text="Skip blank tiles", variable=self.skip_constant)
+        skip_chk.grid(row=3, column=1, sticky="w", padx=6, pady=6)
+        Tooltip(skip_chk, "Don't write tiles that are one flat color (empty borders / padding).\n"
+                          "With T2, the T1 tile decides for both, so pairs stay aligned.")
         tiling.columnconfigure(1, weight=1)
         tiling.columnconfigure(3, weight=1)
 
         # Bands
         bands = ttk.LabelFrame(page, text="Bands (Channels)")
         bands.pack(fill="x", padx=10, pady=10)
+        band_tools = ttk.Frame(bands)
+        band_tools.pack(fill="x", padx=8, pady=(8, 0))
+        ttk.Button(band_tools, text="All", width=6, command=lambda: self._set_all_bands(True))\
+            .pack(side="left")
+        ttk.Button(band_tools, text="None", width=6, command=lambda: self._set_all_bands(False))\
+            .pack(side="left", padx=(6, 0))
         self.band_box = ttk.Frame(bands)
         self.band_box.pack(fill="x", padx=8, pady=8)
+        self.band_box.bind("<Map>", lambda e: self._render_bands())
 
         # Training metadata
         meta = ttk.LabelFrame(page, text="Training Metadata")
@@ -426,7 +903,7 @@ class ImagePrepApp(ttk.Frame):
 
         pq_chk = ttk.Checkbutton(meta, text="Write Parquet alongside CSV", variable=self.write_parquet)
         pq_chk.grid(row=1, column=3, sticky="w", padx=6, pady=6)
-        Tooltip(pq_chk, "If pandas/pyarrow are installed, also write manifest.parquet.")
+        Tooltip(pq_chk, "If pyarrow (or pandas) is installed, also write manifest.parquet.")
 
         meta.columnconfigure(1, weight=1)
         meta.columnconfigure(2, weight=1)
@@ -487,6 +964,8 @@ class ImagePrepApp(ttk.Frame):
         m_manifest_btn = ttk.Button(ops, text="Merge from manifest.csv", command=self._merge_from_manifest_threaded)
         m_manifest_btn.grid(row=1, column=1, padx=6, pady=6)
         Tooltip(m_manifest_btn, "Merge by reading positions from manifest.csv (recommended).")
+        # disabled while a merge is running
+        self._merge_buttons = [merge_btn, m_manifest_btn]
 
         ttk.Label(ops, text="(optional) Fold filter:").grid(row=1, column=2, sticky="e", padx=6, pady=6)
         fold_combo = ttk.Combobox(ops, textvariable=self.merge_fold_var, values=["", "train", "val", "test"],
@@ -494,6 +973,11 @@ class ImagePrepApp(ttk.Frame):
         fold_combo.grid(row=1, column=3, padx=6, pady=6, sticky="w")
         Tooltip(fold_combo, "If set, only rows with this fold are merged from the manifest.")
 
+        pyr_chk = ttk.Checkbutton(ops, text="Write pyramid (TIFF)", variable=self.write_pyramid)
+        pyr_chk.grid(row=2, column=0, padx=6, pady=6, sticky="w")
+        Tooltip(pyr_chk, "For .tif output, also store 2x downsampled overview levels "
+                         "(~33% larger file, much faster zoomed-out viewing).")
+
         return page
 
     # ---------------- Preview Page ----------------
@@ -547,7 +1031,7 @@ class ImagePrepApp(ttk.Frame):
             if not path:
                 return
             try:
-                H, W, C = _probe_image_info_fast(path)
+                H, W, C = _probe_image_info(path)
             except Exception as e:
                 messagebox.showerror("Error", f"Could not read image metadata:\n{e}")
                 return
@@ -600,26 +1084,68 @@ class ImagePrepApp(ttk.Frame):
             messagebox.showerror("Error", f"Failed choosing output file:\n{e}")
 
     # ---------------- Bands ----------------
+    _BAND_COLUMNS = 8  # checkboxes per row, so hyperspectral inputs don't make the page endless
+
     def _populate_bands_from_count(self, bands_count: int):
-        """Populate band checkboxes based on channel count (without loading full image)."""
-        for w in self.band_box.winfo_children():
-            w.destroy()
-        self.selected_bands_vars.clear()
+        """
+        Set the band count (all selected) without loading the image. The selection lives
+        in _band_mask; the checkboxes follow in _render_bands once the Bands box is mapped,
+        so picking files while another page is shown creates no widgets.
+        """
+        self._band_mask = np.ones(max(1, int(bands_count)), dtype=bool)
+        self._bands_dirty = True
+        _preview_cached.cache_clear()  # a new input: previews of the old one are dead weight
+        if self.band_box.winfo_ismapped():
+            self._render_bands()
+
+    def _render_bands(self):
+        """
+        Bring the checkboxes in line with _band_mask. They are pooled: only the difference
+        is gridded / removed, and new widgets are created only when the pool is too small.
+        """
+        if not self._bands_dirty:
+            return
+        self._bands_dirty = False
+        n = len(self._band_mask)
         try:
-            if bands_count <= 1:
+            while len(self._band_widgets) < n:
+                b = len(self._band_widgets)
                 var = tk.IntVar(value=1)
-                ttk.Checkbutton(self.band_box, text="Band 0", variable=var).pack(anchor="w", padx=6, pady=2)
-                self.selected_bands_vars.append(var)
-            else:
-                for b in range(bands_count):
-                    var = tk.IntVar(value=1)
-                    ttk.Checkbutton(self.band_box, text=f"Band {b}", variable=var).pack(anchor="w", padx=6, pady=2)
-                    self.selected_bands_vars.append(var)
+                chk = ttk.Checkbutton(self.band_box, text=f"Band {b}", variable=var,
+                                      command=lambda b=b: self._on_band_toggle(b))
+                self._band_widgets.append((chk, var))
+            for w, _ in self._band_widgets[n:self._bands_shown]:
+                w.grid_remove()
+            for b, (w, _) in enumerate(self._band_widgets[self._bands_shown:n], start=self._bands_shown):
+                w.grid(row=b // self._BAND_COLUMNS, column=b % self._BAND_COLUMNS,
+                       sticky="w", padx=6, pady=2)
+            self._bands_shown = n
+            self.selected_bands_vars[:] = [var for _, var in self._band_widgets[:n]]
+            for var, on in zip(self.selected_bands_vars, self._band_mask.tolist()):
+                var.set(int(on))
         except Exception as e:
             messagebox.showerror("Error", f"Failed populating bands:\n{e}")
 
+    def _clear_bands(self):
+        for w, _ in self._band_widgets[:self._bands_shown]:
+            w.grid_remove()
+        self._bands_shown = 0
+        self._bands_dirty = False
+        self.selected_bands_vars.clear()
+        self._band_mask = np.zeros(0, dtype=bool)
+
+    def _set_all_bands(self, on: bool):
+        self._band_mask[:] = on
+        if not self._bands_dirty:  # otherwise _render_bands copies the mask later
+            for var in self.selected_bands_vars:
+                var.set(int(on))
+
+    def _on_band_toggle(self, b: int):
+        if b < len(self._band_mask):
+            self._band_mask[b] = self.selected_bands_vars[b].get() == 1
+
     def _selected_bands(self):
-        picked = [i for i, v in enumerate(self.selected_bands_vars) if v.get() == 1]
+        picked = np.flatnonzero(self._band_mask).tolist()
         return picked or None
 
     # ---------------- Preview ----------------
@@ -636,56 +1162,78 @@ class ImagePrepApp(ttk.Frame):
             return
 
         try:
-            with Image.open(self.input_path.get()) as im:
-                crop = im.crop((0, 0, min(im.width, tile), min(im.height, tile)))
-                try:
-                    parts = crop.split()
-                    sel = self._selected_bands()
-                    if sel is not None and len(parts) >= max(sel) + 1:
-                        parts_sel = tuple(parts[i] for i in sel)
-                        if len(parts_sel) == 1:
-                            crop = parts_sel[0]
-                        elif len(parts_sel) == 3:
-                            crop = Image.merge("RGB", parts_sel[:3])
-                        elif len(parts_sel) == 4:
-                            crop = Image.merge("RGBA", parts_sel[:4])
-                except Exception:
-                    arr = np.array(crop)
-                    sel = self._selected_bands()
-                    if sel is not None and arr.ndim == 3 and arr.shape[2] >= max(sel) + 1:
-                        arr = arr[:, :, sel]
-                    # min-max normalization
-                    if arr.dtype != np.uint8:
-                        a = arr.astype(np.float32)
-                        if a.ndim == 2:
-                            mn, mx = float(a.min()), float(a.max())
-                            a = (a - mn) / (mx - mn) * 255.0 if mx > mn else np.zeros_like(a)
-                        else:
-                            for c in range(a.shape[2]):
-                                mn, mx = float(a[..., c].min()), float(a[..., c].max())
-                                a[..., c] = (a[..., c] - mn) / (mx - mn) * 255.0 if mx > mn else 0
-                        arr = a.astype(np.uint8)
-                    crop = Image.fromarray(arr)
-
-                max_side = 512
-                scale = min(max_side / max(crop.size), 1.0)
-                if scale < 1.0:
-                    crop = crop.resize((int(crop.width * scale), int(crop.height * scale)), Image.BILINEAR)
-
-                top = tk.Toplevel(self.master)
-                top.title("Preview")
-                top.resizable(False, False)
-                photo = ImageTk.PhotoImage(crop)
-                lbl = ttk.Label(top, image=photo)
-                lbl.image = photo
-                lbl.pack(padx=8, pady=8)
-
-            self.preview_info.config(text="Preview opened (first tile).")
+            H, W, _ = _probe_image_info(self.input_path.get())
+            try:
+                pct = float(self.overlap_pct.get())
+            except Exception:
+                pct = 0.0
+            ny, nx = _tile_grid_shape(H, W, tile, min(max(pct, 0.0), 99.0))
+
+            # T1 and (if set) T2 decode concurrently; Pillow's decoders release the GIL.
+            # Tk variables are read here, on the UI thread, before handing off.
+            sel = self._selected_bands()
+            norm = self.normalize_mode.get()
+            sources = [("T1", self.input_path.get())]
+            t2 = self.input_path_t2.get()
+            if t2 and os.path.isfile(t2):
+                sources.append(("T2", t2))
+            if len(sources) == 1:
+                images = [_build_preview_cached(sources[0][1], tile, sel, norm=norm)]
+            else:
+                with ThreadPoolExecutor(max_workers=len(sources)) as ex:
+                    images = list(ex.map(lambda src: _build_preview_cached(src[1], tile, sel, norm=norm), sources))
+
+            self._show_preview_window([name for name, _ in sources], images)
+
+            self.preview_info.config(text=f"Preview opened (first of {ny * nx} tiles, {ny} x {nx}).")
             self.status.config(text="Preview shown.")
         except Exception as e:
             messagebox.showerror("Preview error", f"Could not preview:\n{e}")
             self.status.config(text="Preview failed.")
 
+    def _show_preview_window(self, names, images):
+        """
+        Show images side by side. If the preview window is still open with the same
+        layout (names, sizes, modes), paste into its existing PhotoImages: a direct
+        block-to-Tk blit, no new Toplevel/PhotoImage per click.
+        """
+        win = getattr(self, "_preview_win", None)
+        layout = [(n, im.size, im.mode) for n, im in zip(names, images)]
+        if win is not None and win.winfo_exists() and self._preview_layout == layout:
+            for photo, im in zip(self._preview_photos, images):
+                photo.paste(im)
+            win.lift()
+            return
+        if win is not None and win.winfo_exists():
+            win.destroy()
+
+        top = tk.Toplevel(self.master)
+        top.title("Preview")
+        top.resizable(False, False)
+        top.protocol("WM_DELETE_WINDOW", self._close_preview_window)
+        photos = []
+        for name, crop in zip(names, images):
+            cell = ttk.Frame(top)
+            cell.pack(side="left", padx=8, pady=8, anchor="n")
+            if len(names) > 1:
+                ttk.Label(cell, text=name).pack(anchor="w")
+            photo = ImageTk.PhotoImage(crop)
+            ttk.Label(cell, image=photo).pack()
+            photos.append(photo)
+        self._preview_win = top
+        self._preview_photos = photos  # keep references alive for Tk
+        self._preview_layout = layout
+
+    def _close_preview_window(self):
+        # drop the PhotoImages with the window so Tk frees their pixel buffers now,
+        # not when the next preview replaces them
+        win = getattr(self, "_preview_win", None)
+        self._preview_win = None
+        self._preview_photos = []
+        self._preview_layout = None
+        if win is not None and win.winfo_exists():
+            win.destroy()
+
     # ---------------- Reset ----------------
     def _reset_all(self):
         """Reset all fields to defaults and clear saved settings file."""
@@ -695,6 +1243,7 @@ class ImagePrepApp(ttk.Frame):
         self.tile_size.set(512)
         self.overlap_pct.set(0.0)
         self.extension.set(".png")
+        self.normalize_mode.set("minmax")
         self.t1_base.set("")
         self.t2_base.set("")
         self.name_pattern.set("{base}_tile_{y}_{x}")
@@ -702,23 +1251,22 @@ class ImagePrepApp(ttk.Frame):
         self.fold.set("train")
         self.label_path.set("")
         self.write_parquet.set(False)
-        for w in self.band_box.winfo_children():
-            w.destroy()
-        self.selected_bands_vars.clear()
+        self.skip_constant.set(False)
+        self._clear_bands()
         self.status.config(text="Reset to defaults.")
         try:
-            if os.path.exists(SETTINGS_FILE):
-                os.remove(SETTINGS_FILE)
+            self._cancel_settings_flush()  # don't let a queued save recreate the file
+            with self._settings_lock:
+                self._settings_on_disk = None
+                if os.path.exists(SETTINGS_FILE):
+                    os.remove(SETTINGS_FILE)
         except Exception:
             pass
 
     # ---------------- Split (threaded) ----------------
     def _do_split_threaded(self):
-        t = threading.Thread(target=self._do_split_worker, daemon=True)
-        t.start()
-
-    def _do_split_worker(self):
-        # Validation
+        # Tk runs on this (UI) thread only: the settings are read, validated and the
+        # progress dialog is built here; the worker gets plain values and touches no widget
         in_path = (self.input_path.get() or "").strip()
         out_dir = (self.output_dir.get() or "").strip()
         if not in_path or not os.path.isfile(in_path):
@@ -738,17 +1286,42 @@ class ImagePrepApp(ttk.Frame):
         if pct < 0 or pct >= 100:
             return self._msg_error("Overlap (%) must be in [0, <100).")
 
+        params = dict(
+            input_path=in_path,
+            output_dir=out_dir,
+            tile_size=tile,
+            extension=self.extension.get(),
+            selected_bands=self._selected_bands(),
+            normalize_mode=self.normalize_mode.get(),
+            policy="auto",
+            name_pattern=self.name_pattern.get(),
+            overlap_pct=pct,
+            t2_path=(self.input_path_t2.get() or "").strip() or None,
+            # custom base names & T2 pattern:
+            t1_base=(self.t1_base.get() or "").strip() or None,
+            t2_base=(self.t2_base.get() or "").strip() or None,
+            name_pattern_t2=None,  # reuse same pattern with different base
+            # manifest per folder:
+            write_manifest=True,
+            scene_id=(self.scene_id.get() or "").strip() or None,
+            label_path=(self.label_path.get() or "").strip(),
+            fold=(self.fold.get() or "train"),
+            write_parquet=bool(self.write_parquet.get()),
+            skip_constant=bool(self.skip_constant.get()),
+        )
+        pd = ProgressDialog(self.master, title="Splitting tiles...", determinate=True)
+        pd.set_message("Splitting tiles...")
+        t = threading.Thread(target=self._do_split_worker, args=(params, pd), daemon=True)
+        t.start()
+
+    def _do_split_worker(self, params: dict, pd: "ProgressDialog"):
         # Estimate total tiles for progress bar
         try:
-            H, W, _ = _probe_image_info_fast(in_path)
-            overlap_px = int(round(tile * pct / 100.0))
-            step = tile if overlap_px <= 0 else max(1, tile - overlap_px)
-            total = math.ceil(H / step) * math.ceil(W / step)
+            H, W, _ = _probe_image_info(params["input_path"])
+            ny, nx = _tile_grid_shape(H, W, params["tile_size"], params["overlap_pct"])
+            total = ny * nx
         except Exception:
             total = 0
-
-        pd = ProgressDialog(self.master, title="Splitting tiles...", determinate=True)
-        pd.set_message("Splitting tiles...")
         if total > 0:
             pd.set_total(total)
         else:
@@ -756,28 +1329,9 @@ class ImagePrepApp(ttk.Frame):
 
         try:
             result = split_large_image(
-                input_path=in_path,
-                output_dir=out_dir,
-                tile_size=tile,
-                extension=self.extension.get(),
-                selected_bands=self._selected_bands(),
-                normalize_mode="minmax",
-                policy="auto",
-                name_pattern=self.name_pattern.get(),
-                overlap_pct=pct,
-                t2_path=(self.input_path_t2.get() or "").strip() or None,
-                # custom base names & T2 pattern:
-                t1_base=(self.t1_base.get() or "").strip() or None,
-                t2_base=(self.t2_base.get() or "").strip() or None,
-                name_pattern_t2=None,  # reuse same pattern with different base
-                # manifest per folder:
-                write_manifest=True,
-                scene_id=(self.scene_id.get() or "").strip() or None,
-                label_path=(self.label_path.get() or "").strip(),
-                fold=(self.fold.get() or "train"),
-                write_parquet=bool(self.write_parquet.get()),
+                **params,
                 # progress callback: return True to cancel
-                progress=lambda i, tot: (pd.step(1), pd.set_message(f"Splitting tiles... ({i+1}/{tot})") or pd.cancelled)[-1],
+                progress=lambda i, tot: (pd.step(1, "Splitting tiles..."), pd.cancelled)[-1],
             )
             pd.close()
 
@@ -790,14 +1344,16 @@ class ImagePrepApp(ttk.Frame):
             if result.get("t2_used"):
                 msg.append(f"T2 dir: {result.get('t2_dir','')}")
                 msg.append(f"T2 manifest: {result.get('t2_manifest','(none)')}")
+            if result.get("skipped"):
+                msg.append(f"Skipped blank tiles: {result['skipped']}")
             if result.get("note"):
                 msg.append(f"Note: {result['note']}")
             self._msg_info("Success", "\n".join(msg))
-            self.status.config(text="Split done.")
+            self._set_status("Split done.")
         except Exception as e:
             pd.close()
             self._msg_error(f"Splitting failed:\n{e}")
-            self.status.config(text="Split failed.")
+            self._set_status("Split failed.")
 
     # ---------------- Merge estimate (folder-based) ----------------
     def _estimate_merge(self):
@@ -805,10 +1361,11 @@ class ImagePrepApp(ttk.Frame):
             if not self.tiles_dir.get():
                 messagebox.showinfo("Estimate", "Please select a tiles folder first.")
                 return
-            files = _scan_tiles(self.tiles_dir.get())
+            meta = _scan_tiles_cached(self.tiles_dir.get())
+            files = list(meta)
             if not files:
                 raise ValueError("No tiles found in the selected folder.")
-            W, H, mode = _estimate_canvas_size(files)
+            W, H, mode = _estimate_canvas_size(files, meta)
             self.merge_estimate_lbl.config(text=f"Estimated: {W} x {H} px, mode: {mode}")
             self.status.config(text="Merge estimate ready.")
         except Exception as e:
@@ -817,79 +1374,65 @@ class ImagePrepApp(ttk.Frame):
 
     # ---------------- Merge (threaded) ----------------
     def _do_merge_threaded(self):
-        t = threading.Thread(target=self._do_merge_worker, daemon=True)
-        t.start()
-
-    def _infer_mode_from_image(self, path: str) -> str:
-        with Image.open(path) as im:
-            m = im.mode
-            if m in ("L", "I;16", "I;16B", "I;16L", "I", "F"):
-                return "L"
-            if m in ("RGBA", "LA"):
-                return "RGBA"
-            return "RGB"
-
-    def _do_merge_worker(self):
-        if not self.tiles_dir.get():
+        # UI thread: settings read, buttons disabled (a second click can't start another
+        # merge) and the progress dialog built before the worker starts
+        tiles_dir = self.tiles_dir.get()
+        out_path = self.merge_out_path.get()
+        if not tiles_dir:
             return self._msg_error("Please select a tiles folder.")
-        if not self.merge_out_path.get():
+        if not out_path:
             return self._msg_error("Please choose an output file.")
+        pyramid = bool(self.write_pyramid.get())
 
-        try:
-            files = _scan_tiles(self.tiles_dir.get())
-            if not files:
-                return self._msg_error("No tiles found in the selected folder.")
-            W, H, _ = _estimate_canvas_size(files)
-            target_mode = self._infer_mode_from_image(files[0])
-        except Exception as e:
-            return self._msg_error(f"Scan failed:\n{e}")
-
-        bg = 0 if target_mode == "L" else (0, 0, 0, 0) if target_mode == "RGBA" else (0, 0, 0)
-        canvas = Image.new(target_mode, (W, H), bg)
-
+        self._config_merge_buttons("disabled")
         pd = ProgressDialog(self.master, title="Merging from folder...", determinate=True)
         pd.set_message("Merging tiles (folder)...")
-        pd.set_total(len(files))
+        t = threading.Thread(target=self._do_merge_worker, args=(tiles_dir, out_path, pyramid, pd), daemon=True)
+        t.start()
 
+    def _config_merge_buttons(self, state: str):
+        # UI thread only; workers go through _set_merge_buttons_state
+        for b in getattr(self, "_merge_buttons", []):
+            b.configure(state=state)
+
+    def _set_merge_buttons_state(self, state: str):
+        self._ui.post(lambda: self._config_merge_buttons(state))
+
+    def _do_merge_worker(self, tiles_dir: str, out_path: str, pyramid: bool, pd: "ProgressDialog"):
         try:
-            import re
-            _TILE_RE = re.compile(r".*_(\d+)_(\d+)\.[A-Za-z0-9]+$")
-            for i, fp in enumerate(files):
-                if pd.cancelled:
-                    break
-                with Image.open(fp) as im:
-                    if im.mode != target_mode:
-                        im = im.convert(target_mode)
-                    m = _TILE_RE.match(os.path.basename(fp))
-                    if not m:
-                        pd.step(1)
-                        continue
-                    y = int(m.group(1))
-                    x = int(m.group(2))
-                    canvas.paste(im, (x, y))
-                if i % 16 == 0:
-                    pd.set_message(f"Merging tiles... ({i+1}/{len(files)})")
-                pd.step(1)
+            try:
+                meta = _scan_tiles_cached(tiles_dir)
+            except Exception as e:
+                pd.close()
+                return self._msg_error(f"Scan failed:\n{e}")
+            if not meta:
+                pd.close()
+                return self._msg_error("No tiles found in the selected folder.")
+            pd.set_total(len(meta))
 
-            pd.close()
-            if pd.cancelled:
-                self._msg_warn("Merge cancelled. No output saved.")
-                self.status.config(text="Merge cancelled.")
-            else:
-                canvas.save(self.merge_out_path.get())
-                self._msg_info("Success", f"Merged image saved.\nSize: {W} x {H}")
-                self.status.config(text="Merge from folder done.")
-                self.merge_estimate_lbl.config(text=f"Merged: {W} x {H}")
-        except Exception as e:
-            pd.close()
-            self._msg_error(f"Merge failed:\n{e}")
-            self.status.config(text="Merge failed.")
+            def _progress(i, total):
+                pd.step(1, "Merging tiles...")
+                return pd.cancelled
 
-    def _merge_from_manifest_threaded(self):
-        t = threading.Thread(target=self._merge_from_manifest_worker, daemon=True)
-        t.start()
+            try:
+                size = merge_tiles(tiles_dir, out_path, metadata=meta, progress=_progress, pyramid=pyramid)
+                pd.close()
+                if size is None:
+                    self._msg_warn("Merge cancelled. No output saved.")
+                    self._set_status("Merge cancelled.")
+                else:
+                    W, H = size
+                    self._msg_done(f"Merge from folder done — {W} x {H}.")
+                    self._ui.post(lambda: self.merge_estimate_lbl.config(text=f"Merged: {W} x {H}"))
+            except Exception as e:
+                pd.close()
+                self._msg_error(f"Merge failed:\n{e}")
+                self._set_status("Merge failed.")
+        finally:
+            self._set_merge_buttons_state("normal")
 
-    def _merge_from_manifest_worker(self):
+    def _merge_from_manifest_threaded(self):
+        # UI thread: the file dialogs, the Tk variables and the progress dialog
         manifest_path = filedialog.askopenfilename(
             title="Select manifest.csv",
             filetypes=[("CSV files", "*.csv"), ("All files", "*.*")]
@@ -907,102 +1450,43 @@ class ImagePrepApp(ttk.Frame):
                 return
             self.merge_out_path.set(out)
 
-        # Read manifest rows (+ optional fold filter)
-        try:
-            with open(manifest_path, "r", encoding="utf-8") as f:
-                reader = csv.DictReader(f)
-                header = [c.strip() for c in (reader.fieldnames or [])]
-
-                # Path column can be t1_path, t2_path, or generic path
-                img_col = None
-                for cand in ("t1_path", "t2_path", "path"):
-                    if cand in header:
-                        img_col = cand
-                        break
-                if img_col is None:
-                    return self._msg_error("Manifest must contain a path column (t1_path / t2_path / path).")
-
-                for req in ["x0", "y0", "w", "h"]:
-                    if req not in header:
-                        return self._msg_error(f"Manifest missing column: {req}")
-
-                rows = [r for r in reader]
-        except Exception as e:
-            return self._msg_error(f"Could not read manifest:\n{e}")
-
-        fold_filter = (self.merge_fold_var.get() or "").strip()
-        if fold_filter:
-            rows = [r for r in rows if (r.get("fold", "").lower() == fold_filter.lower())]
-
-        if not rows:
-            return self._msg_error("No rows to merge (after filtering).")
-
-        # Canvas size + target mode
-        try:
-            max_x2 = 0
-            max_y2 = 0
-            first_img = None
-            for r in rows:
-                x0 = int(float(r["x0"])); y0 = int(float(r["y0"]))
-                w = int(float(r["w"]));   h = int(float(r["h"]))
-                max_x2 = max(max_x2, x0 + w)
-                max_y2 = max(max_y2, y0 + h)
-                if not first_img and (r.get(img_col) or "").strip():
-                    first_img = r[img_col].strip()
-            if not first_img:
-                return self._msg_error("No valid path in manifest.")
-            target_mode = self._infer_mode_from_image(first_img)
-        except Exception as e:
-            return self._msg_error(f"Manifest parse error:\n{e}")
-
-        bg = 0 if target_mode == "L" else (0, 0, 0, 0) if target_mode == "RGBA" else (0, 0, 0)
-        canvas = Image.new(target_mode, (max_x2, max_y2), bg)
+        fold_filter = (self.merge_fold_var.get() or "").strip() or None
+        out_path = self.merge_out_path.get()
+        pyramid = bool(self.write_pyramid.get())
 
+        self._config_merge_buttons("disabled")
         pd = ProgressDialog(self.master, title="Merging from manifest...", determinate=True)
         pd.set_message("Merging tiles (manifest)...")
-        pd.set_total(len(rows))
-
-        try:
-            for i, r in enumerate(rows):
-                if pd.cancelled:
-                    break
-
-                img_path = (r.get(img_col) or "").strip()
-                if not img_path or not os.path.isfile(img_path):
-                    pd.step(1)
-                    continue
-
-                try:
-                    x0 = int(float(r["x0"])); y0 = int(float(r["y0"]))
-                    w = int(float(r["w"]));   h = int(float(r["h"]))
-                except Exception:
-                    pd.step(1)
-                    continue
-
-                with Image.open(img_path) as im:
-                    if im.mode != target_mode:
-                        im = im.convert(target_mode)
-                    if im.size != (w, h):
-                        im = im.resize((w, h), Image.BILINEAR)
-                    canvas.paste(im, (x0, y0))
+        t = threading.Thread(target=self._merge_from_manifest_worker,
+                             args=(manifest_path, out_path, fold_filter, pyramid, pd), daemon=True)
+        t.start()
 
-                if i % 32 == 0:
-                    pd.set_message(f"Merging tiles... ({i+1}/{len(rows)})")
-                pd.step(1)
+    def _merge_from_manifest_worker(self, manifest_path: str, out_path: str, fold_filter, pyramid: bool,
+                                    pd: "ProgressDialog"):
+        def _progress(i, total):
+            if i == 0:
+                pd.set_total(total)  # rows with an existing tile file, known once parsed
+            pd.step(1, "Merging tiles...")
+            return pd.cancelled
 
+        try:
+            # path column auto-detected: t1_path / t2_path / path
+            size = merge_tiles_from_manifest(manifest_path, out_path, fold_filter=fold_filter,
+                                             progress=_progress, pyramid=pyramid)
             pd.close()
-            if pd.cancelled:
+            if size is None:
                 self._msg_warn("Merge (manifest) cancelled. No output saved.")
-                self.status.config(text="Merge from manifest cancelled.")
+                self._set_status("Merge from manifest cancelled.")
             else:
-                canvas.save(self.merge_out_path.get())
-                self._msg_info("Success", f"Merged image saved.\nSize: {max_x2} x {max_y2}")
-                self.status.config(text="Merge from manifest done.")
-                self.merge_estimate_lbl.config(text=f"Merged: {max_x2} x {max_y2}")
+                W, H = size
+                self._msg_done(f"Merge from manifest done — {W} x {H}.")
+                self._ui.post(lambda: self.merge_estimate_lbl.config(text=f"Merged: {W} x {H}"))
         except Exception as e:
             pd.close()
             self._msg_error(f"Merge (manifest) failed:\n{e}")
-            self.status.config(text="Merge from manifest failed.")
+            self._set_status("Merge from manifest failed.")
+        finally:
+            self._set_merge_buttons_state("normal")
 
     # ---------------- Help helpers ----------------
     def _reload_help_text(self, box_widget=None):
@@ -1039,15 +1523,56 @@ class ImagePrepApp(ttk.Frame):
 
     # ---------------- Messages & Settings ----------------
     def _msg_info(self, title, text):
-        self.master.after(0, lambda: messagebox.showinfo(title, text))
+        if self.no_dialog:
+            self._ui.post(lambda: self.status.config(text=f"{title}: {text.splitlines()[0]}"))
+            return
+        self._ui.post(lambda: messagebox.showinfo(title, text))
+
+    def _msg_done(self, text):
+        """Non-modal success notice: status line + bell (no dialog to click away)."""
+        def _apply():
+            self.status.config(text=text)
+            self.master.bell()
+        self._ui.post(_apply)
+
+    # worker threads report through the UI queue, never by touching Tk themselves
+    def _set_status(self, text):
+        self._ui.post(lambda: self.status.config(text=text))
 
     def _msg_error(self, text):
-        self.master.after(0, lambda: messagebox.showerror("Error", text))
+        self._ui.post(lambda: messagebox.showerror("Error", text))
 
     def _msg_warn(self, text):
-        self.master.after(0, lambda: messagebox.showwarning("Warning", text))
+        self._ui.post(lambda: messagebox.showwarning("Warning", text))
+
+    _SETTINGS_DEBOUNCE_MS = 500
 
     def _save_settings(self):
+        """Mark settings dirty; one write happens _SETTINGS_DEBOUNCE_MS after the last change."""
+        self._settings_dirty = True
+        after_id = getattr(self, "_settings_after_id", None)
+        if after_id is not None:
+            self.master.after_cancel(after_id)  # trailing edge: a burst of changes -> one write
+        self._settings_after_id = self.master.after(self._SETTINGS_DEBOUNCE_MS, self._flush_settings)
+
+    def _cancel_settings_flush(self):
+        after_id = getattr(self, "_settings_after_id", None)
+        if after_id is not None:
+            try:
+                self.master.after_cancel(after_id)
+            except Exception:
+                pass
+        self._settings_after_id = None
+        self._settings_dirty = False
+        with self._settings_lock:
+            self._settings_pending = None  # nor a snapshot a writer thread hasn't picked up yet
+
+    def _flush_settings(self, sync: bool = False):
+        """Snapshot the Tk vars (UI thread) and write them; off the UI thread unless sync."""
+        self._settings_after_id = None
+        if not getattr(self, "_settings_dirty", False):
+            return
+        self._settings_dirty = False
         data = {
             "input_path": self.input_path.get(),
             "input_path_t2": self.input_path_t2.get(),
@@ -1055,6 +1580,7 @@ class ImagePrepApp(ttk.Frame):
             "tile_size": self.tile_size.get(),
             "overlap_pct": float(self.overlap_pct.get()),
             "extension": self.extension.get(),
+            "normalize_mode": self.normalize_mode.get(),
             "t1_base": self.t1_base.get(),
             "t2_base": self.t2_base.get(),
             "name_pattern": self.name_pattern.get(),
@@ -1062,29 +1588,64 @@ class ImagePrepApp(ttk.Frame):
             "fold": self.fold.get(),
             "label_path": self.label_path.get(),
             "write_parquet": bool(self.write_parquet.get()),
+            "skip_constant": bool(self.skip_constant.get()),
             "tiles_dir": self.tiles_dir.get(),
             "merge_out_path": self.merge_out_path.get(),
             "merge_fold": self.merge_fold_var.get(),
+            "write_pyramid": bool(self.write_pyramid.get()),
             "theme": self.theme_var.get(),
         }
-        try:
-            with open(SETTINGS_FILE, "w", encoding="utf-8") as f:
-                json.dump(data, f, indent=2)
-        except Exception:
-            pass
+        with self._settings_lock:
+            self._settings_pending = data
+        if sync:
+            self._write_pending_settings()
+        else:
+            # a slow (e.g. network) drive must not stall the UI
+            threading.Thread(target=self._write_pending_settings, daemon=True).start()
+
+    def _write_pending_settings(self):
+        # the lock serializes writers on the .tmp file; the latest snapshot wins, older ones are dropped
+        with self._settings_lock:
+            data, self._settings_pending = self._settings_pending, None
+            if data is None:
+                return
+            tmp = SETTINGS_FILE + ".tmp"
+            try:
+                # serialize first, then a single write (orjson if installed). Both give the
+                # same bytes: orjson writes non-ASCII (e.g. Arabic paths) as raw UTF-8, so
+                # json does too (ensure_ascii=False), not as \uXXXX escapes
+                if HAS_ORJSON:
+                    payload = orjson.dumps(data, option=orjson.OPT_INDENT_2)
+                else:
+                    payload = json.dumps(data, indent=2, ensure_ascii=False).encode("utf-8")
+                if payload == self._settings_on_disk:
+                    return  # unchanged (e.g. closing right after a save): no rewrite, no fsync
+                with open(tmp, "wb") as f:
+                    f.write(payload)
+                    f.flush()
+                    os.fsync(f.fileno())  # off the UI thread, so durability is affordable
+                os.replace(tmp, SETTINGS_FILE)  # atomic: never a half-written settings file
+                self._settings_on_disk = payload
+            except Exception:
+                pass
 
     def _load_settings(self):
         if not os.path.exists(SETTINGS_FILE):
             return
         try:
-            with open(SETTINGS_FILE, "r", encoding="utf-8") as f:
-                data = json.load(f)
+            with open(SETTINGS_FILE, "rb") as f:
+                raw = f.read()
+            data = json.loads(raw)
+            with self._settings_lock:
+                self._settings_on_disk = raw
             self.input_path.set(data.get("input_path") or "")
             self.input_path_t2.set(data.get("input_path_t2") or "")
             self.output_dir.set(data.get("output_dir") or "")
             self.tile_size.set(int(data.get("tile_size", 512)))
             self.overlap_pct.set(float(data.get("overlap_pct", 0.0)))
             self.extension.set(data.get("extension") or ".png")
+            norm = data.get("normalize_mode")
+            self.normalize_mode.set(norm if norm in NORMALIZE_MODES else "minmax")
             self.t1_base.set(data.get("t1_base", ""))
             self.t2_base.set(data.get("t2_base", ""))
             self.name_pattern.set(data.get("name_pattern") or "{base}_tile_{y}_{x}")
@@ -1092,15 +1653,17 @@ class ImagePrepApp(ttk.Frame):
             self.fold.set(data.get("fold", "train"))
             self.label_path.set(data.get("label_path", ""))
             self.write_parquet.set(bool(data.get("write_parquet", False)))
+            self.skip_constant.set(bool(data.get("skip_constant", False)))
             self.tiles_dir.set(data.get("tiles_dir", ""))
             self.merge_out_path.set(data.get("merge_out_path", ""))
             self.merge_fold_var.set(data.get("merge_fold", ""))
+            self.write_pyramid.set(bool(data.get("write_pyramid", False)))
             self.theme_var.set(data.get("theme", "System"))
             self._apply_theme_colors(self.theme_var.get())
 
             if self.input_path.get():
                 try:
-                    _, _, C = _probe_image_info_fast(self.input_path.get())
+                    _, _, C = _probe_image_info(self.input_path.get())
                     self._populate_bands_from_count(C)
                 except Exception:
                     pass
@@ -1112,11 +1675,54 @@ class ImagePrepApp(ttk.Frame):
         # try:
         #     if os.path.exists(SETTINGS_FILE): os.remove(SETTINGS_FILE)
         # except Exception: pass
-        self._save_settings()
+        self._cancel_settings_flush()
+        self._settings_dirty = True
+        self._flush_settings(sync=True)  # daemon writer threads would die with the process
         self.master.destroy()
 
 
-def run_app():
+def _prefer_omp_threading_layer():
+    """Pick numba's OpenMP layer for this process unless the environment names one.
+
+    The splitter's kernels are launched from worker / preview threads: TBB hangs interpreter
+    exit after a non-main-thread launch and workqueue aborts on concurrent ones.
+    """
+    if os.environ.get("NUMBA_THREADING_LAYER") or os.environ.get("NUMBA_THREADING_LAYER_PRIORITY"):
+        return
+    try:
+        import numba
+    except Exception:
+        return
+    numba.config.THREADING_LAYER_PRIORITY = ["omp", "tbb", "workqueue"]
+
+
+def _run_headless(args) -> int:
+    """Folder merge without Tk (for scripts and benchmarking)."""
+    if not args.tiles or not args.out:
+        print("--headless needs --tiles and --out", file=sys.stderr)
+        return 2
+    try:
+        size = merge_tiles(args.tiles, args.out, pyramid=args.pyramid)
+    except Exception as e:
+        print(f"Merge failed: {e}", file=sys.stderr)
+        return 1
+    print(f"{size[0]} x {size[1]}")
+    return 0
+
+
+def run_app(argv=None):
+    ap = argparse.ArgumentParser(prog=APP_TITLE)
+    ap.add_argument("--headless", action="store_true", help="merge a tiles folder without opening the GUI")
+    ap.add_argument("--tiles", help="tiles folder (headless)")
+    ap.add_argument("--out", help="merged output file (headless)")
+    ap.add_argument("--pyramid", action="store_true", help="write TIFF overview levels (headless)")
+    ap.add_argument("--no-dialog", action="store_true", help="report success in the status bar only")
+    args = ap.parse_args(argv)
+    _prefer_omp_threading_layer()
+    if args.headless:
+        return _run_headless(args)
+
     root = tk.Tk()
-    app = ImagePrepApp(root)
+    app = ImagePrepApp(root, no_dialog=args.no_dialog)
     root.mainloop()
+    return 0
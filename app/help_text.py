@@ -35,10 +35,19 @@ Core inputs
      {{base}}_tile_{{y}}_{{x}}
      {{base}}_{{y:05d}}_{{x:05d}}
    Note: merge-from-folder expects both {{y}} and {{x}} in the name.
+9) Normalize: how 16-bit / float data is scaled to 8-bit tiles (8-bit input is kept as-is):
+   - minmax: per band, min..max -> 0..255
+   - global_minmax: per band, min..max of the whole image -> 0..255, so all tiles share
+     one scale (no brightness jumps between neighbouring tiles)
+   - percentile: per band, 2nd..98th percentile -> 0..255 (outliers clipped, NaN pixels -> 0)
+   - clip: values kept, clipped to 0..255
+10) Skip blank tiles: tiles that come out as one flat color (empty borders, padding)
+   are neither written nor listed in the manifest. With T2, the T1 tile decides for the pair.
 
 Band selection
 --------------
-If your image has multiple bands, choose which bands to export.
+If your image has multiple bands, choose which bands to export
+(All / None toggle every band at once).
 When saving as JPEG/WEBP you must have 1 (grayscale) or 3 (RGB) channels.
 PNG/TIFF safely support up to 4 channels.
 
@@ -70,15 +79,30 @@ Preview
 Merge
 -----
 • From Folder: requires filenames that end with _<y>_<x>.<ext>  
+  Tile sizes are cached in a small .tilecache.json inside the tiles folder, so re-scans are fast.
 • From manifest.csv (recommended and more accurate):
   Reads x0, y0, w, h and the image path from the column (t1_path / t2_path / path).
   Prefer manifest-based merge because it does not rely on a strict naming scheme.
+• Write pyramid (TIFF): for .tif output, adds 2x downsampled overview levels so viewers open
+  large merges quickly (file ~33% larger).
+• Merged .tif outputs are tiled and deflate-compressed (with a predictor); the tiles are
+  compressed on several threads.
 
 Performance tips
 ----------------
 • For very large images, use a smaller tile_size to reduce memory usage.  
-• TIFF with LZW compression offers a good size/speed trade-off.  
+• TIFF tiles are written with deflate + predictor when **tifffile** and **imagecodecs** are
+  installed (about half the size of LZW, and faster); otherwise Pillow writes LZW.
+• Uncompressed TIFF inputs are memory-mapped when splitting (with **tifffile** installed):
+  tiles are read straight from the file instead of decoding the whole image first.
+  Compressed TIFFs are read one internal tile / strip at a time, so tiled TIFFs keep
+  memory use low as well.
+• Tiles are encoded for speed: PNG at zlib level 1 and JPEG at quality 95 without the
+  extra optimize pass (files are a few % larger than with the library defaults).
 • Installing the **imagecodecs** package speeds up I/O, especially for TIFF/PNG.
+• Optional: installing **numba** speeds up min-max normalization of 16-bit / float
+  images, both when splitting and in previews (the first use per data type compiles
+  once, then it is cached on disk).
 
 Common errors & fixes
 ---------------------
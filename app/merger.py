@@ -1,31 +1,161 @@
 # app/merger.py
+import contextlib
+import io
+import math
 import os
 import re
 import csv
-from typing import List, Tuple, Dict, Optional
+import json
+import struct
+import tempfile
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple, Dict, Optional, Callable, Iterable, Iterator, Any
 
-from PIL import Image
+import numpy as np
+from PIL import Image, UnidentifiedImageError
+
+try:
+    import tifffile as _TT
+    HAS_TIFFILE = True
+except Exception:
+    HAS_TIFFILE = False
+
+try:
+    import imagecodecs as _IC
+    HAS_IMAGECODECS = True
+except Exception:
+    HAS_IMAGECODECS = False
+
+_TIFF_TILE = 256  # tile edge of the streamed TIFF writer
+_BAND_BYTES = 32 * 1024 * 1024  # target working set per band (~ an L3 cache)
+# in-memory canvases at least this large live in a temp file next to the output instead
+_MEMMAP_CANVAS_BYTES = 4 * 1024 ** 3
+# merged TIFFs: deflate + horizontal predictor, tiles compressed on tifffile's worker threads
+_TIFF_COMPRESSION: Dict[str, Any] = {"compression": "zlib", "compressionargs": {"level": 6}, "predictor": True}
+
+
+# =========================
+# Parallel tile loading
+# =========================
+
+def _default_workers() -> int:
+    """CPUs this process may run on (affinity / cpuset aware where the OS exposes it)."""
+    if hasattr(os, "process_cpu_count"):  # Python 3.13+
+        n = os.process_cpu_count()
+    elif hasattr(os, "sched_getaffinity"):
+        n = len(os.sched_getaffinity(0))
+    else:
+        n = os.cpu_count()
+    return n or 4
+
+
+def _default_io_workers() -> int:
+    # header probes mostly wait on open/read (worst on network shares), not on the CPU
+    return min(64, 4 * _default_workers())
+
+
+def _imap_bounded(fn: Callable[[Any], Any], items: Iterable[Any],
+                  max_workers: Optional[int] = None) -> Iterator[Any]:
+    """
+    Like ThreadPoolExecutor.map, but keeps at most 2*max_workers tasks in flight
+    so decoded tiles don't pile up in memory. Results are yielded in input order.
+    Closed early (cancel / error), queued tasks are dropped and the running ones are
+    waited for: once close() returns, no task touches anything the caller hands out.
+    Callers whose tasks write into a buffer they free afterwards (the canvas) close it
+    explicitly, e.g. with contextlib.closing, before leaving the buffer's scope.
+    """
+    n = max(1, int(max_workers or _default_workers()))
+    with ThreadPoolExecutor(max_workers=n) as ex:
+        pending = deque()
+        try:
+            for item in items:
+                pending.append(ex.submit(fn, item))
+                if len(pending) >= 2 * n:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for fut in pending:
+                fut.cancel()
 
 
 # =========================
 # Utilities for folder-based merge (legacy / existing)
 # =========================
 
-_TILE_RE = re.compile(r".*_(\d+)_(\d+)\.[A-Za-z0-9]+$")  # ..._<y>_<x>.<ext>
+# ..._<y>_<x>.<ext>; used with .search() so there is no leading '.*' to backtrack over
+_TILE_RE = re.compile(r"_(\d+)_(\d+)\.[A-Za-z0-9]+$")
+
+
+_IMAGE_EXTS = (".png", ".jpg", ".jpeg", ".tif", ".tiff", ".bmp", ".webp")
+
+
+def _parse_tile_name(name: str) -> Optional[Tuple[int, int, int]]:
+    """
+    Parse a tile file name '..._<y>_<x>.<ext>' into (prefix_len, y, x), where name[:prefix_len]
+    is the part before '_<y>_<x>'. Returns None if the name does not match.
+    Splits on '.' / '_' first (several times faster than the regex, and runs once per tile
+    during scans); _TILE_RE is only the fallback.
+    """
+    stem, dot, ext = name.rpartition(".")
+    if dot and ext.isascii() and ext.isalnum():
+        parts = stem.rsplit("_", 2)
+        if len(parts) == 3 and parts[1].isdecimal() and parts[2].isdecimal():
+            return len(parts[0]), int(parts[1]), int(parts[2])
+    m = _TILE_RE.search(name)
+    if not m:
+        return None
+    return m.start(), int(m.group(1)), int(m.group(2))
+
+
+def _tile_sort_key(path: str) -> Tuple[str, str, int, int, str]:
+    """
+    Order tiles by folder, base name, then numeric (y, x), i.e. the order the splitter
+    wrote them in (plain string sorting would put _10_ before _2_).
+    """
+    folder, name = os.path.split(path)
+    parsed = _parse_tile_name(name)
+    if parsed is None:
+        return (folder, name, -1, -1, name)
+    k, y, x = parsed
+    return (folder, name[:k], y, x, name)
+
+
+def _scan_tile_entries(tiles_dir: str) -> List[os.DirEntry]:
+    """
+    Recursive os.scandir walk returning DirEntry objects for image files under tiles_dir,
+    sorted with _tile_sort_key. Entries carry the directory listing's type info (and,
+    on Windows, the stat result), so callers don't need another stat per file.
+    Like os.walk, symlinked directories are not descended into.
+    """
+    found: List[os.DirEntry] = []
+    stack = [tiles_dir]
+    while stack:
+        folder = stack.pop()
+        try:
+            it = os.scandir(folder)
+        except OSError:
+            continue
+        with it:
+            for e in it:
+                try:
+                    if e.is_dir():
+                        if not e.is_symlink():
+                            stack.append(e.path)
+                    elif e.name.lower().endswith(_IMAGE_EXTS):  # accept images only
+                        found.append(e)
+                except OSError:
+                    continue
+    # keep deterministic order
+    found.sort(key=lambda e: _tile_sort_key(e.path))
+    return found
 
 
 def _scan_tiles(tiles_dir: str) -> List[str]:
     """Return a sorted list of tile file paths under tiles_dir."""
-    paths: List[str] = []
-    for root, _, files in os.walk(tiles_dir):
-        for fn in files:
-            fp = os.path.join(root, fn)
-            # accept images only
-            if fn.lower().endswith((".png", ".jpg", ".jpeg", ".tif", ".tiff", ".bmp", ".webp")):
-                paths.append(fp)
-    # keep deterministic order
-    paths.sort()
-    return paths
+    return [e.path for e in _scan_tile_entries(tiles_dir)]
 
 
 def _extract_xy_from_name(path: str) -> Optional[Tuple[int, int]]:
@@ -33,25 +163,119 @@ def _extract_xy_from_name(path: str) -> Optional[Tuple[int, int]]:
     Extract (x, y) from filename suffix '_<y>_<x>.<ext>'.
     Returns (x, y) or None if not matched.
     """
-    m = _TILE_RE.match(os.path.basename(path))
-    if not m:
+    parsed = _parse_tile_name(os.path.basename(path))
+    if parsed is None:
         return None
-    y = int(m.group(1))
-    x = int(m.group(2))
+    _, y, x = parsed
     return (x, y)
 
 
-def _estimate_canvas_size(files: List[str]) -> Tuple[int, int, str]:
+# Pillow plugin per tile extension: Image.open(formats=...) then skips probing the others
+_PIL_FORMATS = {".png": ["PNG"], ".jpg": ["JPEG"], ".jpeg": ["JPEG"], ".tif": ["TIFF"], ".tiff": ["TIFF"],
+                ".bmp": ["BMP"], ".webp": ["WEBP"]}
+
+
+def _open_image(fp: str, data: Optional[bytes] = None) -> Image.Image:
+    """
+    Image.open of fp (or of its already-read bytes), trying the plugin its extension names
+    first; a file whose content doesn't match its extension is still opened by probing.
+    """
+    formats = _PIL_FORMATS.get(os.path.splitext(fp)[1].lower())
+    if formats:
+        try:
+            return Image.open(fp if data is None else io.BytesIO(data), formats=formats)
+        except UnidentifiedImageError:
+            pass
+    return Image.open(fp if data is None else io.BytesIO(data))
+
+
+def _probe_header(fp: str) -> Tuple[int, int, str]:
+    """Header-only read of (w, h, mode)."""
+    with _open_image(fp) as im:
+        w, h = im.size
+        return int(w), int(h), im.mode
+
+
+_TILE_CACHE_NAME = ".tilecache.json"
+
+
+def _scan_tiles_cached(tiles_dir: str, max_workers: Optional[int] = None) -> Dict[str, Tuple[int, int, str]]:
+    """
+    Like _scan_tiles, but also returns each tile's header info as {path: (w, h, mode)}.
+    Header reads are cached in tiles_dir/.tilecache.json and only redone for files
+    whose (mtime, size) changed, so repeated scans of the same folder are just stats.
+    Those header reads run on max_workers threads (default: 4 per CPU, max 64).
+    """
+    found = _scan_tile_entries(tiles_dir)
+    files = [e.path for e in found]
+    cache_path = os.path.join(tiles_dir, _TILE_CACHE_NAME)
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            old = json.load(f)
+        if not isinstance(old, dict):
+            old = {}
+    except Exception:
+        old = {}
+
+    meta: Dict[str, Tuple[int, int, str]] = {}
+    entries: Dict[str, List[Any]] = {}
+    stale: List[Tuple[str, str, List[int]]] = []
+    # scandir paths are tiles_dir + sep + ..., so the cache key is a plain slice
+    # (os.path.relpath re-normalizes and getcwd()s both paths on every call)
+    prefix = os.path.join(tiles_dir, "")
+    for e in found:
+        fp = e.path
+        try:
+            st = e.stat()
+        except OSError:
+            continue
+        rel = fp[len(prefix):] if fp.startswith(prefix) else os.path.relpath(fp, tiles_dir)
+        stamp = [st.st_mtime_ns, st.st_size]
+        hit = old.get(rel)
+        if isinstance(hit, list) and len(hit) == 5 and hit[3:] == stamp:
+            meta[fp] = (int(hit[0]), int(hit[1]), str(hit[2]))
+            entries[rel] = hit
+        else:
+            stale.append((fp, rel, stamp))
+
+    for (fp, rel, stamp), (w, h, mode) in zip(stale, _imap_bounded(_probe_header, [s[0] for s in stale],
+                                                                    max_workers or _default_io_workers())):
+        meta[fp] = (w, h, mode)
+        entries[rel] = [w, h, mode] + stamp
+
+    if stale or len(entries) != len(old):
+        tmp = cache_path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(entries, f)
+            os.replace(tmp, cache_path)
+        except Exception:
+            pass  # read-only folder etc.; the cache is only an optimization
+
+    # keep _scan_tiles order
+    return {fp: meta[fp] for fp in files if fp in meta}
+
+
+def _estimate_canvas_size(
+    files: List[str],
+    metadata: Optional[Dict[str, Tuple[int, int, str]]] = None,
+) -> Tuple[int, int, str]:
     """
     Estimate canvas size from a set of tiles named with '_<y>_<x>'.
+    With metadata (from _scan_tiles_cached) each tile's own size is used and no
+    file is opened; otherwise every tile is assumed to be as large as the first.
     Returns (W, H, mode_hint).
     """
     if not files:
         raise ValueError("No tile files found.")
-    # open first to get size/mode
-    with Image.open(files[0]) as im0:
-        tw, th = im0.size
-        mode = im0.mode
+    if metadata is not None and files[0] in metadata:
+        tw, th, mode = metadata[files[0]]
+    else:
+        metadata = None
+        # open first to get size/mode
+        with _open_image(files[0]) as im0:
+            tw, th = im0.size
+            mode = im0.mode
 
     max_x2 = 0
     max_y2 = 0
@@ -61,8 +285,9 @@ def _estimate_canvas_size(files: List[str]) -> Tuple[int, int, str]:
             # fall back: pack tiles in grid by index (not ideal)
             continue
         x, y = xy
-        max_x2 = max(max_x2, x + tw)
-        max_y2 = max(max_y2, y + th)
+        w, h = (metadata[fp][0], metadata[fp][1]) if metadata is not None and fp in metadata else (tw, th)
+        max_x2 = max(max_x2, x + w)
+        max_y2 = max(max_y2, y + h)
 
     if max_x2 == 0 or max_y2 == 0:
         # fallback if names not matched
@@ -74,17 +299,473 @@ def _estimate_canvas_size(files: List[str]) -> Tuple[int, int, str]:
     return (max_x2, max_y2, mode)
 
 
-def merge_tiles(tiles_dir: str, output_path: str) -> Tuple[int, int]:
+def _read_file_bytes(fp: str) -> bytes:
+    """
+    Read a whole tile file with as few syscalls as possible.
+    Pillow's own file reader pulls data in small blocks; reading everything up front
+    (with a sequential-access hint where the OS supports it) and decoding from memory
+    avoids that read amplification.
+    """
+    fd = os.open(fp, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+    try:
+        size = os.fstat(fd).st_size
+        if hasattr(os, "posix_fadvise"):
+            try:
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            except OSError:
+                pass
+        parts = []
+        remaining = size
+        while remaining > 0:
+            chunk = os.read(fd, remaining)
+            if not chunk:
+                break
+            parts.append(chunk)
+            remaining -= len(chunk)
+        return parts[0] if len(parts) == 1 else b"".join(parts)
+    finally:
+        os.close(fd)
+
+
+_PREFETCH_BLOCK = 64
+
+
+def _prefetch_files(paths: List[str]) -> None:
+    """
+    Ask the kernel to start reading a group of files, in inode order (which usually
+    follows on-disk allocation for tiles written one after another). Workers then
+    find the data in the page cache. No-op where posix_fadvise is unavailable.
+    """
+    if not hasattr(os, "posix_fadvise") or not paths:
+        return
+    keyed = []
+    for fp in paths:
+        try:
+            keyed.append((os.stat(fp).st_ino, fp))
+        except OSError:
+            pass
+    for _, fp in sorted(keyed):
+        try:
+            fd = os.open(fp, os.O_RDONLY)
+        except OSError:
+            continue
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+
+def _with_prefetch(items: List[Any], key: Callable[[Any], str], block: int = _PREFETCH_BLOCK) -> Iterator[Any]:
+    """Yield items unchanged, prefetching each block of files just before it is consumed."""
+    for i in range(0, len(items), block):
+        chunk = items[i:i + block]
+        _prefetch_files([key(t) for t in chunk])
+        yield from chunk
+
+
+_MODE_CHANNELS = {"L": None, "RGB": 3, "RGBA": 4}
+
+# source modes that _blit can widen itself (gray -> RGB(A), RGB -> RGBA)
+_EXPANDABLE = {"RGB": ("L",), "RGBA": ("L", "RGB")}
+
+
+# lossless formats imagecodecs decodes bit-identically to Pillow
+_DIRECT_DECODE_EXT = (".png", ".tif", ".tiff")
+
+
+def _decode_direct(fp: str, data: bytes, mode: str) -> Optional[np.ndarray]:
+    """
+    Decode straight to an ndarray with imagecodecs (no PIL image + tobytes() copy).
+    Returns None when not applicable, so the caller falls back to Pillow.
+    """
+    if not HAS_IMAGECODECS or mode not in _MODE_CHANNELS or not fp.lower().endswith(_DIRECT_DECODE_EXT):
+        return None
+    try:
+        arr = _IC.imread(data)
+    except Exception:
+        return None
+    c = _MODE_CHANNELS[mode]
+    if arr.dtype == np.uint8 and ((c is None and arr.ndim == 2) or (c and arr.ndim == 3 and arr.shape[2] == c)):
+        return arr
+    return None
+
+
+# PNG IHDR colour type -> Pillow mode, for 8-bit images (palette / other depths: not listed)
+_PNG_COLOR_MODES = {0: "L", 2: "RGB", 4: "LA", 6: "RGBA"}
+_PNG_COLOR_TYPES = {1: 0, 2: 4, 3: 2, 4: 6}  # channels -> IHDR colour type (for _write_png_streamed)
+
+
+def _png_header_mode(data: bytes) -> Optional[str]:
+    """Mode of an 8-bit PNG from its IHDR bytes (no decoder involved), else None."""
+    if len(data) < 26 or data[:8] != b"\x89PNG\r\n\x1a\n" or data[12:16] != b"IHDR" or data[24] != 8:
+        return None
+    return _PNG_COLOR_MODES.get(data[25])
+
+
+def _load_tile_array(fp: str, target_mode: str, mode: Optional[str] = None) -> np.ndarray:
+    """
+    Decode one tile to a uint8 array for a target_mode canvas (worker thread).
+    L/RGB tiles going onto a wider canvas are returned as-is and widened by _blit
+    straight into the destination, skipping a converted temporary copy.
+    mode: the tile's own mode if known (header probe); enables the imagecodecs path.
+    Unknown (e.g. manifest merges) is read from the IHDR for PNG tiles, so those
+    skip the Pillow decode + mode check too.
+    """
+    data = _read_file_bytes(fp)
+    if mode is None:
+        mode = _png_header_mode(data)
+    if mode is not None and (mode == target_mode or mode in _EXPANDABLE.get(target_mode, ())):
+        arr = _decode_direct(fp, data, mode)
+        if arr is not None:
+            return arr
+    with _open_image(fp, data) as im:
+        if im.mode != target_mode and im.mode not in _EXPANDABLE.get(target_mode, ()):
+            im = im.convert(target_mode)
+        return np.asarray(im)
+
+
+def _blank_canvas(H: int, W: int, target_mode: str) -> np.ndarray:
+    c = _MODE_CHANNELS[target_mode]
+    return np.zeros((H, W) if c is None else (H, W, c), dtype=np.uint8)
+
+
+@contextlib.contextmanager
+def _canvas_array(H: int, W: int, target_mode: str, output_path: str) -> Iterator[np.ndarray]:
+    """
+    Zeroed canvas for the non-streamed merges: _blank_canvas, or, from _MEMMAP_CANVAS_BYTES
+    up, an np.memmap over a temp file in the output folder, so a huge canvas is paged
+    by the OS instead of needing that much RAM (a fresh file reads as zeros). The temp
+    file is removed on exit, and the memmap unmapped: every worker writing into the
+    canvas must be done by then (close the _imap_bounded generator inside the block).
+    """
+    c = _MODE_CHANNELS[target_mode]
+    shape = (H, W) if c is None else (H, W, c)
+    if H * W * (c or 1) < _MEMMAP_CANVAS_BYTES:
+        yield np.zeros(shape, dtype=np.uint8)
+        return
+    fd, tmp = tempfile.mkstemp(suffix=".canvas", dir=os.path.dirname(os.path.abspath(output_path)))
+    os.close(fd)
+    canvas = np.memmap(tmp, dtype=np.uint8, mode="w+", shape=shape)
+    try:
+        yield canvas
+    finally:
+        canvas._mmap.close()  # unmap before removing (required on Windows)
+        del canvas
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+
+
+def _blit(dst: np.ndarray, arr: np.ndarray, x: int, y: int) -> None:
+    """
+    Copy arr into dst with its top-left at (x, y), clipped to dst (offsets may be negative).
+    A gray or RGB tile on an RGB/RGBA canvas is widened on the fly (same result as
+    PIL convert: gray replicated into R,G,B; alpha set to 255).
+    """
+    H, W = dst.shape[:2]
+    sy0 = max(0, -y)
+    sx0 = max(0, -x)
+    sy1 = min(arr.shape[0], H - y)
+    sx1 = min(arr.shape[1], W - x)
+    if sy1 <= sy0 or sx1 <= sx0:
+        return
+    src = arr[sy0:sy1, sx0:sx1]
+    view = dst[y + sy0:y + sy1, x + sx0:x + sx1]
+    if src.ndim == view.ndim and (src.ndim == 2 or src.shape[2] == view.shape[2]):
+        view[...] = src
+        return
+    if src.ndim == 2:
+        view[..., :3] = src[..., None]
+    else:
+        view[..., :3] = src[..., :3]
+    if view.shape[2] == 4:
+        view[..., 3] = 255
+
+
+def _is_tiff_path(path: str) -> bool:
+    return path.lower().endswith((".tif", ".tiff"))
+
+
+class _MergeCancelled(Exception):
+    """Raised inside the writers when the progress callback asks to cancel."""
+
+
+def _uniform_tile_size(
+    placed: List[Tuple[str, int, int, int, int]],
+    W: int, H: int,
+    modes: Iterable[str],
+    target_mode: str,
+) -> Optional[Tuple[int, int]]:
+    """
+    (tw, th) if every tile has the same size, already has target_mode and lies fully
+    inside the canvas, i.e. a blit needs no clipping or channel widening; else None.
+    """
+    if not placed or any(m != target_mode for m in modes):
+        return None
+    sizes = {(w, h) for (_, _, _, w, h) in placed}
+    if len(sizes) != 1:
+        return None
+    tw, th = sizes.pop()
+    xy = np.array([(x, y) for (_, x, y, _, _) in placed], dtype=np.int64)
+    if xy.min() < 0 or xy[:, 0].max() + tw > W or xy[:, 1].max() + th > H:
+        return None
+    return (tw, th)
+
+
+def _merge_tiles_uniform(
+    placed: List[Tuple[str, int, int, int, int]],
+    tw: int, th: int,
+    canvas: np.ndarray,
+    load: Callable[[str], np.ndarray],
+    max_workers: Optional[int] = None,
+    progress: Optional[Callable[[int, int], bool]] = None,
+) -> bool:
+    """
+    Specialized canvas merge for same-size tiles (see _uniform_tile_size): each tile is
+    one slice store with no bounds math. When all offsets sit on the tile grid the
+    canvas is viewed as (rows, th, cols, tw[, C]) and indexed by (row, col) directly.
+    If, in addition, no grid cell is used twice, paste order can't matter: each decode
+    worker stores its own tile, so the copies run in parallel (NumPy drops the GIL for
+    them) instead of one after another on this thread.
+    Returns False if cancelled.
+    """
+    H, W = canvas.shape[:2]
+    xy = np.array([(x, y) for (_, x, y, _, _) in placed], dtype=np.int64)
+    on_grid = H % th == 0 and W % tw == 0 and not (xy[:, 0] % tw).any() and not (xy[:, 1] % th).any()
+    total = len(placed)
+    if on_grid:
+        grid = canvas.reshape((H // th, th, W // tw, tw) + canvas.shape[2:])
+        cols, rows = (xy[:, 0] // tw).tolist(), (xy[:, 1] // th).tolist()
+        if len(set(zip(rows, cols))) == total:
+            def place(item: Tuple[int, Tuple[str, int, int, int, int]]) -> None:
+                i, t = item
+                grid[rows[i], :, cols[i]] = load(t[0])
+
+            # closed before returning: the workers write into canvas, which the caller
+            # may unmap (_canvas_array) as soon as this returns
+            done = _imap_bounded(place, _with_prefetch(list(enumerate(placed)), key=lambda it: it[1][0]),
+                                 max_workers)
+            with contextlib.closing(done):
+                for i, _ in enumerate(done):
+                    if progress and progress(i, total):
+                        return False
+            return True
+    else:
+        xs, ys = xy[:, 0].tolist(), xy[:, 1].tolist()
+
+    arrays = _imap_bounded(lambda t: load(t[0]),
+                           _with_prefetch(placed, key=lambda t: t[0]), max_workers)
+    with contextlib.closing(arrays):
+        for i, arr in enumerate(arrays):
+            if progress and progress(i, total):
+                return False
+            if on_grid:
+                grid[rows[i], :, cols[i]] = arr
+            else:
+                canvas[ys[i]:ys[i] + th, xs[i]:xs[i] + tw] = arr
+    return True
+
+
+def _write_tiff_streamed(
+    placed: List[Tuple[str, int, int, int, int]],
+    W: int,
+    H: int,
+    target_mode: str,
+    output_path: str,
+    load: Callable[[str], np.ndarray],
+    max_workers: Optional[int] = None,
+    progress: Optional[Callable[[int, int], bool]] = None,
+    pyramid: bool = False,
+    background=None,
+) -> None:
+    """
+    Stream a merge straight into a tiled TIFF, one horizontal band at a time.
+    Bands are a multiple of _TIFF_TILE rows, sized so one band is about _BAND_BYTES,
+    so pasting and handing tiles to the encoder stay cache-resident.
+    placed: (path, x, y, w, h) in paste order; later entries win in overlaps.
+    load: path -> decoded tile array (called on worker threads).
+    Only the tiles intersecting the current band are kept decoded, so peak memory
+    is O(W * band_h) instead of O(W * H).
+    pyramid: also write 2x-downsampled overviews as SubIFDs (down to ~1024 px).
+    Level 1 is collected while the bands go by, so this costs 1/4 of the canvas in RAM.
+    background: fill for pixels no tile covers (None = zeros).
+    Raises _MergeCancelled if progress returns True.
+    """
+    channels = _MODE_CHANNELS[target_mode]
+    n_levels = max(0, int(math.log2(max(W, H) / 1024))) if pyramid else 0
+    level1 = _blank_canvas(H // 2, W // 2, target_mode) if n_levels else None
+    row_bytes = max(1, W * (channels or 1))
+    band_h = max(_TIFF_TILE, (_BAND_BYTES // row_bytes) // _TIFF_TILE * _TIFF_TILE)
+    n_bands = (H + band_h - 1) // band_h
+
+    # which tiles start / stop being needed at each band
+    starts: Dict[int, List[int]] = {}
+    ends: Dict[int, List[int]] = {}
+    for idx, (_, x, y, w, h) in enumerate(placed):
+        if x >= W or y >= H or w <= 0 or h <= 0:
+            continue
+        b0 = y // band_h
+        b1 = min(n_bands - 1, (y + h - 1) // band_h)
+        starts.setdefault(b0, []).append(idx)
+        ends.setdefault(b1, []).append(idx)
+
+    def bands() -> Iterator[np.ndarray]:
+        active: Dict[int, np.ndarray] = {}
+        done = 0
+        total = len(placed)
+        with ThreadPoolExecutor(max_workers=max(1, int(max_workers or _default_workers()))) as ex:
+            for b in range(n_bands):
+                by = b * band_h
+                bh = min(band_h, H - by)
+                new = starts.get(b, [])
+                _prefetch_files([placed[i][0] for i in new])
+                for idx, arr in zip(new, ex.map(lambda i: load(placed[i][0]), new)):
+                    if progress and progress(done, total):
+                        raise _MergeCancelled()
+                    done += 1
+                    active[idx] = arr
+
+                band = _blank_canvas(bh, W, target_mode)
+                if background is not None:
+                    band[...] = background
+                for idx in sorted(active):
+                    _, x, y, _, _ = placed[idx]
+                    _blit(band, active[idx], x, y - by)
+
+                for idx in ends.get(b, []):
+                    active.pop(idx, None)
+                if level1 is not None:
+                    # band_h is even, so only the last band can have an odd row (dropped, as in H // 2)
+                    half = _downsample2(band)
+                    level1[by // 2:by // 2 + half.shape[0]] = half[:, :level1.shape[1]]
+                yield band
+
+    def tiles() -> Iterator[np.ndarray]:
+        for band in bands():
+            for ty in range(0, band.shape[0], _TIFF_TILE):
+                for tx in range(0, W, _TIFF_TILE):
+                    yield band[ty:ty + _TIFF_TILE, tx:tx + _TIFF_TILE]
+
+    shape = (H, W) if channels is None else (H, W, channels)
+    kwargs = _tiff_write_kwargs(channels, max_workers)
+    with _TT.TiffWriter(output_path, bigtiff=(W * H * (channels or 1)) > 2 ** 31) as tif:
+        tif.write(
+            tiles(),
+            shape=shape,
+            dtype=np.uint8,
+            tile=(_TIFF_TILE, _TIFF_TILE),
+            subifds=n_levels or None,
+            **kwargs,
+        )
+        level = level1
+        for _ in range(n_levels):
+            tif.write(level, tile=(_TIFF_TILE, _TIFF_TILE), subfiletype=1, **kwargs)
+            level = _downsample2(level)
+
+
+def _tiff_write_kwargs(channels: Optional[int], max_workers: Optional[int] = None) -> Dict[str, Any]:
+    """tifffile write() options shared by every merged TIFF level: layout, compression, threads."""
+    kwargs: Dict[str, Any] = {"photometric": "minisblack" if channels is None else "rgb"}
+    if channels == 4:
+        kwargs["extrasamples"] = ["unassalpha"]
+    kwargs.update(_TIFF_COMPRESSION)
+    kwargs["maxworkers"] = max(1, int(max_workers or _default_workers()))
+    return kwargs
+
+
+def _png_chunk(f, tag: bytes, data) -> None:
+    f.write(struct.pack(">I", len(data)))
+    f.write(tag)
+    f.write(data)
+    f.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(tag))))
+
+
+def _write_png_streamed(canvas: np.ndarray, output_path: str, rows: int = 256) -> None:
+    """
+    8-bit PNG written `rows` rows at a time (Up filter, zlib level 6), so a memmap canvas
+    is never copied into one Pillow image (which would need the whole canvas in RAM).
+    """
+    H, W = canvas.shape[:2]
+    c = 1 if canvas.ndim == 2 else canvas.shape[2]
+    comp = zlib.compressobj(6)
+    prev = np.zeros(W * c, dtype=np.uint8)  # the row above the first one counts as zeros
+    with open(output_path, "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        _png_chunk(f, b"IHDR", struct.pack(">IIBBBBB", W, H, 8, _PNG_COLOR_TYPES[c], 0, 0, 0))
+        for y in range(0, H, rows):
+            block = np.asarray(canvas[y:y + rows]).reshape(-1, W * c)
+            buf = np.empty((block.shape[0], W * c + 1), dtype=np.uint8)
+            buf[:, 0] = 2  # filter type Up: byte - byte above (mod 256)
+            np.subtract(block[0], prev, out=buf[0, 1:])
+            np.subtract(block[1:], block[:-1], out=buf[1:, 1:])
+            prev = block[-1].copy()
+            data = comp.compress(buf)
+            if data:
+                _png_chunk(f, b"IDAT", data)
+        _png_chunk(f, b"IDAT", comp.flush())
+        _png_chunk(f, b"IEND", b"")
+
+
+def _save_canvas(canvas: np.ndarray, output_path: str, max_workers: Optional[int] = None) -> None:
+    """
+    Save a finished in-memory canvas. TIFFs go through tifffile when available (tiled,
+    compressed on several threads, BigTIFF past 2 GiB); memmap canvases saved as PNG are
+    streamed by _write_png_streamed; everything else goes through Pillow.
+    """
+    if HAS_TIFFILE and _is_tiff_path(output_path):
+        channels = None if canvas.ndim == 2 else canvas.shape[2]
+        _TT.imwrite(output_path, canvas, bigtiff=canvas.nbytes > 2 ** 31,
+                    tile=(_TIFF_TILE, _TIFF_TILE), **_tiff_write_kwargs(channels, max_workers))
+    elif _is_tiff_path(output_path):
+        Image.fromarray(canvas).save(output_path, compression="tiff_adobe_deflate")
+    elif isinstance(canvas, np.memmap) and output_path.lower().endswith(".png"):
+        _write_png_streamed(canvas, output_path)
+    else:
+        Image.fromarray(canvas).save(output_path)
+
+
+def _downsample2(arr: np.ndarray) -> np.ndarray:
+    """2x2 box average (odd trailing row/column dropped), computed in uint16."""
+    h = arr.shape[0] // 2 * 2
+    w = arr.shape[1] // 2 * 2
+    a = arr[:h:2, :w:2].astype(np.uint16)
+    a += arr[1:h:2, :w:2]
+    a += arr[:h:2, 1:w:2]
+    a += arr[1:h:2, 1:w:2]
+    a += 2
+    a >>= 2
+    return a.astype(np.uint8)
+
+
+def merge_tiles(
+    tiles_dir: str,
+    output_path: str,
+    max_workers: Optional[int] = None,
+    metadata: Optional[Dict[str, Tuple[int, int, str]]] = None,
+    # progress callback: fn(i:int, total:int) -> bool (return True to cancel)
+    progress: Optional[Callable[[int, int], bool]] = None,
+    pyramid: bool = False,
+) -> Optional[Tuple[int, int]]:
     """
     Merge tiles from a folder where filenames end with '_<y>_<x>.<ext>'.
     Last write wins in overlapping areas.
-    Returns (W, H) of the merged image.
+    Tiles are decoded on a thread pool; pasting stays on the calling thread.
+    TIFF outputs are streamed band-by-band (needs tifffile) instead of
+    building the full canvas in RAM.
+    metadata: result of _scan_tiles_cached(tiles_dir), if the caller already has it.
+    pyramid: for streamed TIFF output, add 2x overview levels (ignored otherwise).
+    Returns (W, H) of the merged image, or None if cancelled (nothing is saved).
     """
-    files = _scan_tiles(tiles_dir)
+    if metadata is None:
+        metadata = _scan_tiles_cached(tiles_dir, max_workers)
+    files = list(metadata)
     if not files:
         raise ValueError("No tiles found in the selected folder.")
 
-    W, H, mode_hint = _estimate_canvas_size(files)
+    W, H, mode_hint = _estimate_canvas_size(files, metadata)
 
     # choose target mode
     target_mode = "RGB"
@@ -93,22 +774,46 @@ def merge_tiles(tiles_dir: str, output_path: str) -> Tuple[int, int]:
     elif mode_hint in ("RGBA", "LA"):
         target_mode = "RGBA"
 
-    bg = 0 if target_mode in ("L",) else (0, 0, 0, 0) if target_mode == "RGBA" else (0, 0, 0)
-    canvas = Image.new(target_mode, (W, H), bg)
-
+    # (path, x, y, w, h) in file order; names without '_<y>_<x>' are skipped (strict)
+    placed = []
     for fp in files:
-        with Image.open(fp) as im:
-            if im.mode != target_mode:
-                im = im.convert(target_mode)
-            xy = _extract_xy_from_name(fp)
-            if xy is None:
-                # if not matched, skip or place sequentially (we skip to be strict)
-                continue
-            x, y = xy
-            canvas.paste(im, (x, y))
-
-    canvas.save(output_path)
-    return canvas.size
+        xy = _extract_xy_from_name(fp)
+        if xy is not None:
+            placed.append((fp, xy[0], xy[1], metadata[fp][0], metadata[fp][1]))
+
+    def load(fp: str) -> np.ndarray:
+        return _load_tile_array(fp, target_mode, metadata[fp][2])
+
+    if HAS_TIFFILE and _is_tiff_path(output_path):
+        try:
+            _write_tiff_streamed(placed, W, H, target_mode, output_path, load, max_workers, progress, pyramid)
+        except _MergeCancelled:
+            try:
+                os.remove(output_path)  # drop the partial file
+            except OSError:
+                pass
+            return None
+        return (W, H)
+
+    # plain uint8 canvas + slice assignment (a memcpy per row) instead of Image.paste;
+    # results come back in file order, so "last write wins" is preserved
+    uniform = _uniform_tile_size(placed, W, H, (metadata[t[0]][2] for t in placed), target_mode)
+    with _canvas_array(H, W, target_mode, output_path) as canvas:
+        if uniform is not None:
+            if not _merge_tiles_uniform(placed, uniform[0], uniform[1], canvas, load, max_workers, progress):
+                return None
+        else:
+            arrays = _imap_bounded(lambda t: load(t[0]),
+                                   _with_prefetch(placed, key=lambda t: t[0]), max_workers)
+            total = len(placed)
+            with contextlib.closing(arrays):
+                for i, ((_, x, y, _, _), arr) in enumerate(zip(placed, arrays)):
+                    if progress and progress(i, total):
+                        return None
+                    _blit(canvas, arr, x, y)
+
+        _save_canvas(canvas, output_path, max_workers)
+    return (W, H)
 # =========================
 # END: folder-based merge
 # =========================
@@ -118,29 +823,102 @@ def merge_tiles(tiles_dir: str, output_path: str) -> Tuple[int, int]:
 # NEW: Merge from manifest.csv
 # =========================
 
-_REQUIRED_COLS = ["x0", "y0", "w", "h", "t1_path"]
-# optional: scene_id,tile_x,tile_y,t2_path,label_path,fold
+_REQUIRED_COLS = ["x0", "y0", "w", "h"]
+# plus one image path column (see _PATH_COLS); optional: scene_id,tile_x,tile_y,label_path,fold
+_PATH_COLS = ("t1_path", "t2_path", "path")  # auto-detect order: T1 manifest, T2 manifest, generic
+
+
+def _read_manifest_arrow(manifest_csv: str, header: List[str]) -> Optional[Dict[str, List[str]]]:
+    """
+    Data rows of manifest_csv through pyarrow's (multithreaded, block-parsing) CSV reader,
+    every column kept as str like csv.reader gives. None if pyarrow isn't installed or the
+    file needs csv's leniency (ragged rows, newlines inside quotes).
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.csv as pac
+    except ImportError:
+        return None
+    try:
+        table = pac.read_csv(
+            manifest_csv,
+            read_options=pac.ReadOptions(column_names=header, skip_rows=1),
+            convert_options=pac.ConvertOptions(column_types={c: pa.string() for c in header},
+                                               strings_can_be_null=False,
+                                               quoted_strings_can_be_null=False),
+        )
+    except Exception:
+        return None
+    return table.to_pydict()
 
 
-def _read_manifest(manifest_csv: str) -> List[Dict[str, str]]:
+def _read_manifest(manifest_csv: str) -> Dict[str, List[str]]:
+    """
+    manifest.csv column-wise: {header name (stripped): values}. pyarrow's reader when
+    available, else csv.reader + one zip transpose instead of a dict per row; short rows
+    are padded with "" (blank lines skipped).
+    """
     if not os.path.isfile(manifest_csv):
         raise FileNotFoundError(f"Manifest not found: {manifest_csv}")
-    rows: List[Dict[str, str]] = []
-    with open(manifest_csv, "r", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        header = [c.strip() for c in reader.fieldnames or []]
+    with open(manifest_csv, "r", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        header = [c.strip() for c in next(reader, [])]
         missing = [c for c in _REQUIRED_COLS if c not in header]
         if missing:
             raise ValueError(f"Manifest is missing required columns: {missing}")
-        for r in reader:
-            rows.append(r)
-    if not rows:
+        cols = _read_manifest_arrow(manifest_csv, header)
+        if cols is None:
+            n = len(header)
+            rows = [r if len(r) == n else (r + [""] * n)[:n] for r in reader if r]
+            cols = dict(zip(header, map(list, zip(*rows))))
+    if not cols or not cols[_REQUIRED_COLS[0]]:
         raise ValueError("Manifest is empty.")
-    return rows
+    return cols
+
+
+def _existing_files(paths: List[str]) -> List[bool]:
+    """
+    [os.path.isfile(p) for p in paths], from one scandir per parent folder: a manifest
+    lists thousands of tiles in a handful of folders, and a stat per row is slow (on
+    Windows and network shares especially). Folders that can't be listed fall back to isfile.
+    """
+    listed: Dict[str, Optional[set]] = {}
+    out: List[bool] = []
+    for p in paths:
+        d, name = os.path.split(p)
+        if d not in listed:
+            try:
+                with os.scandir(d or ".") as it:
+                    listed[d] = {os.path.normcase(e.name) for e in it if e.is_file()}
+            except OSError:
+                listed[d] = None
+        names = listed[d]
+        out.append(os.path.isfile(p) if names is None else os.path.normcase(name) in names)
+    return out
+
+
+def _disjoint_tiles(xywh: np.ndarray) -> bool:
+    """
+    True if no two rectangles of the (N, 4) int (x, y, w, h) array overlap, checked as a
+    grid (ragged edges are fine): the distinct x spans don't overlap each other, nor do
+    the distinct y spans, and no (x, y) cell repeats. Overlapping splits and shuffled
+    layouts give False. lexsort-based (np.unique(axis=0) is ~10x slower).
+    """
+    x, y, w, h = xywh.T
+    for lo, ln in ((x, w), (y, h)):
+        hi = lo + ln
+        o = np.lexsort((hi, lo))
+        lo, hi = lo[o], hi[o]
+        new = np.r_[True, (lo[1:] != lo[:-1]) | (hi[1:] != hi[:-1])]  # first of each distinct span
+        lo, hi = lo[new], hi[new]
+        if (lo[1:] < hi[:-1]).any():
+            return False
+    o = np.lexsort((x, y))
+    return not ((x[o][1:] == x[o][:-1]) & (y[o][1:] == y[o][:-1])).any()
 
 
 def _infer_target_mode(first_image_path: str) -> str:
-    with Image.open(first_image_path) as im:
+    with _open_image(first_image_path) as im:
         m = im.mode
         if m in ("L", "I;16", "I;16B", "I;16L", "I", "F"):
             return "L"
@@ -153,77 +931,125 @@ def merge_tiles_from_manifest(
     manifest_csv: str,
     output_path: str,
     fold_filter: Optional[str] = None,
-    column: str = "t1_path",
+    column: Optional[str] = None,
     background: Optional[Tuple[int, ...]] = None,
-) -> Tuple[int, int]:
+    max_workers: Optional[int] = None,
+    # progress callback: fn(i:int, total:int) -> bool (return True to cancel)
+    progress: Optional[Callable[[int, int], bool]] = None,
+    pyramid: bool = False,
+) -> Optional[Tuple[int, int]]:
     """
     Merge tiles described in manifest.csv.
-    - Uses x0,y0,w,h and the image path column (default: t1_path).
+    - Uses x0,y0,w,h and the image path column: `column`, or (None) the first of
+      t1_path / t2_path / path present, so T1 and T2 manifests both work.
     - If fold_filter is provided, only rows with fold==fold_filter are used.
-    - Overlaps are pasted in file order; last one wins.
-    Returns (W, H).
+    - Rows whose file is missing are skipped.
+    - Tiles are decoded on a thread pool; pasting stays on the calling thread, in
+      file order, so overlaps still resolve as "last one wins".
+    - Same canvas handling as merge_tiles: a uint8 NumPy canvas with slice stores, and
+      TIFF outputs streamed band-by-band (needs tifffile),
+      with optional pyramid overviews.
+    Returns (W, H), or None if cancelled (nothing is saved).
     """
-    rows = _read_manifest(manifest_csv)
+    cols = _read_manifest(manifest_csv)
+    if column is None:
+        column = next((c for c in _PATH_COLS if c in cols), None)
+        if column is None:
+            raise ValueError("Manifest must contain a path column (t1_path / t2_path / path).")
+    elif column not in cols:
+        raise ValueError(f"Manifest is missing required columns: {[column]}")
 
     # optional fold filtering
+    paths = cols[column]
+    geometry = [cols[c] for c in _REQUIRED_COLS]
     if fold_filter:
-        rows = [r for r in rows if (r.get("fold", "").lower() == fold_filter.lower())]
-        if not rows:
+        want = fold_filter.lower()
+        keep = [i for i, f in enumerate(cols.get("fold") or [""] * len(paths)) if f.lower() == want]
+        if not keep:
             raise ValueError(f"No rows found for fold='{fold_filter}' in manifest.")
+        paths = [paths[i] for i in keep]
+        geometry = [[col[i] for i in keep] for col in geometry]
 
-    # compute canvas size
-    max_x2 = 0
-    max_y2 = 0
-    first_img_path = None
-    for r in rows:
-        try:
-            x0 = int(float(r["x0"]))
-            y0 = int(float(r["y0"]))
-            w = int(float(r["w"]))
-            h = int(float(r["h"]))
-        except Exception:
-            raise ValueError("Manifest x0/y0/w/h must be numeric.")
-        max_x2 = max(max_x2, x0 + w)
-        max_y2 = max(max_y2, y0 + h)
-        if not first_img_path:
-            candidate = (r.get(column) or "").strip()
-            if candidate:
-                first_img_path = candidate
-
-    if not first_img_path:
+    # x0/y0/w/h parsed in one NumPy pass each (truncated like int(float(v)))
+    try:
+        xywh = np.array(geometry, dtype=np.float64)
+    except ValueError:
+        raise ValueError("Manifest x0/y0/w/h must be numeric.")
+    if not np.isfinite(xywh).all():
+        raise ValueError("Manifest x0/y0/w/h must be numeric.")
+    xywh = xywh.astype(np.int64)
+
+    # compute canvas size; collect the tiles to paste as (path, x, y, w, h)
+    max_x2 = max(0, int((xywh[0] + xywh[2]).max()))
+    max_y2 = max(0, int((xywh[1] + xywh[3]).max()))
+    placed: List[Tuple[str, int, int, int, int]] = []
+    paths = [p.strip() for p in paths]
+    found = np.fromiter((bool(p) and ok for p, ok in zip(paths, _existing_files(paths))),
+                        dtype=bool, count=len(paths))
+    placed_xywh = xywh.T[found]  # geometry of the rows kept, for _disjoint_tiles
+    for img_path, ok, x0, y0, w, h in zip(paths, found.tolist(), *xywh.tolist()):
+        if ok:
+            placed.append((img_path, x0, y0, w, h))
+
+    if not placed:
         raise ValueError(f"No valid image paths found in manifest column '{column}'.")
 
-    target_mode = _infer_target_mode(first_img_path)
-    if background is None:
-        background = 0 if target_mode == "L" else (0, 0, 0, 0) if target_mode == "RGBA" else (0, 0, 0)
+    target_mode = _infer_target_mode(placed[0][0])
+    W, H = max_x2, max_y2
+    declared = {fp: (w, h) for fp, _, _, w, h in placed}
 
-    canvas = Image.new(target_mode, (max_x2, max_y2), background)
+    def load(fp: str) -> np.ndarray:
+        arr = _load_tile_array(fp, target_mode)
+        w, h = declared[fp]
+        if arr.shape[:2] != (h, w):
+            # resize to declared tile size in manifest to be safe
+            im = Image.fromarray(arr)
+            k = min(im.width // max(1, w), im.height // max(1, h))
+            if k >= 2:
+                im = im.reduce(k)  # integer box shrink first: exact area average, far cheaper
+            if im.size != (w, h):
+                im = im.resize((w, h), Image.Resampling.BILINEAR)
+            arr = np.asarray(im)
+        return arr
 
-    for r in rows:
-        img_path = (r.get(column) or "").strip()
-        if not img_path or not os.path.isfile(img_path):
-            # skip silently; could also raise warning
-            continue
+    if HAS_TIFFILE and _is_tiff_path(output_path):
         try:
-            x0 = int(float(r["x0"]))
-            y0 = int(float(r["y0"]))
-            w = int(float(r["w"]))
-            h = int(float(r["h"]))
-        except Exception:
-            # skip bad row
-            continue
+            _write_tiff_streamed(placed, W, H, target_mode, output_path, load, max_workers, progress, pyramid,
+                                 background)
+        except _MergeCancelled:
+            try:
+                os.remove(output_path)  # drop the partial file
+            except OSError:
+                pass
+            return None
+        return (W, H)
+
+    with _canvas_array(H, W, target_mode, output_path) as canvas:
+        if background is not None:
+            canvas[...] = background
+
+        total = len(placed)
+        if _disjoint_tiles(placed_xywh):
+            # every tile owns its canvas slice, so the workers paste too, in any order.
+            # Closed (pool drained) before the with block can unmap a memmap canvas
+            done = _imap_bounded(lambda t: _blit(canvas, load(t[0]), t[1], t[2]),
+                                 _with_prefetch(placed, key=lambda t: t[0]), max_workers)
+            with contextlib.closing(done):
+                for i, _ in enumerate(done):
+                    if progress and progress(i, total):
+                        return None
+        else:
+            # overlapping tiles: pasted here in manifest order, later rows on top
+            arrays = _imap_bounded(lambda t: load(t[0]),
+                                   _with_prefetch(placed, key=lambda t: t[0]), max_workers)
+            with contextlib.closing(arrays):
+                for i, ((_, x0, y0, _, _), arr) in enumerate(zip(placed, arrays)):
+                    if progress and progress(i, total):
+                        return None
+                    _blit(canvas, arr, x0, y0)
 
-        with Image.open(img_path) as im:
-            if im.mode != target_mode:
-                im = im.convert(target_mode)
-            # ensure size agrees (w,h) if present; if not, just paste
-            if (w, h) != im.size:
-                # resize to declared tile size in manifest to be safe
-                im = im.resize((w, h), Image.BILINEAR)
-            canvas.paste(im, (x0, y0))
-
-    canvas.save(output_path)
-    return canvas.size
+        _save_canvas(canvas, output_path, max_workers)
+    return (W, H)
 # =========================
 # END: merge from manifest
 # =========================
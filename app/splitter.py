@@ -1,10 +1,21 @@
+import csv
+import functools
+import io
 import os
+import shutil
+import string
+import struct
+import threading
 import warnings
-from typing import List, Optional, Dict, Any, Tuple, Callable
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import List, Optional, Dict, Any, Tuple, Callable, Iterator, Union
 
 import numpy as np
 from PIL import Image
 
+from app.merger import _default_workers
+
 # اسمح بفتح الصور العملاقة (وكتم تحذير DecompressionBomb)
 Image.MAX_IMAGE_PIXELS = None
 warnings.simplefilter("ignore", Image.DecompressionBombWarning)
@@ -17,13 +28,37 @@ try:
 except Exception:
     HAS_TIFFILE = False
 
+try:
+    import imagecodecs as _IC
+    HAS_IMAGECODECS = True
+except Exception:
+    HAS_IMAGECODECS = False
+
+try:
+    import numba as _NB
+    from numba import njit, prange
+    HAS_NUMBA = True
+except Exception:
+    HAS_NUMBA = False
+
 
 # ---------------- I/O helpers ----------------
 def _load_image_any(input_path: str) -> np.ndarray:
-    """Load image with Pillow first; fallback to tifffile for BigTIFF/multi-page."""
+    """
+    Load image with Pillow first; fallback to tifffile for BigTIFF/multi-page.
+    Uncompressed TIFFs come back as a read-only memmap of the file instead (nothing is
+    read until the pixels are used), as split_large_image opens them.
+    """
+    if HAS_TIFFILE and input_path.lower().endswith((".tif", ".tiff")):
+        try:
+            arr = _tiff_page_array(input_path, memmap=True)
+            if arr is not None:
+                return arr
+        except Exception:
+            pass
     try:
         with Image.open(input_path) as im:
-            arr = np.array(im)
+            arr = np.asarray(im)
         if arr.ndim in (2, 3):
             return arr
     except Exception:
@@ -40,6 +75,235 @@ def _load_image_any(input_path: str) -> np.ndarray:
     raise ValueError(f"Unsupported image format or could not load image: {input_path}")
 
 
+# what np.asarray gives for common Pillow modes (the split reports it without decoding)
+_PIL_MODE_DTYPES = {"1": "bool", "I": "int32", "F": "float32", "I;16": "uint16", "I;16L": "uint16",
+                    **{m: "uint8" for m in ("L", "P", "LA", "PA", "RGB", "RGBA", "RGBX", "CMYK", "YCbCr")}}
+
+
+class _ArraySource:
+    """H x W (x C) array with the bits of the Image API the splitter uses (size / crop / load / close)."""
+
+    def __init__(self, arr: np.ndarray):
+        self._arr = arr
+        self.size = (arr.shape[1], arr.shape[0])
+        self.dtype = arr.dtype
+
+    def crop(self, box: Tuple[int, int, int, int]) -> np.ndarray:
+        x, y, x2, y2 = box
+        return self._arr[y:y2, x:x2]  # a view; for a memmap only these rows are read
+
+    def load(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self._arr = None
+
+
+class _TiffSegmentSource:
+    """
+    A compressed TIFF page read a segment (tile or strip) at a time, same API as _ArraySource.
+    crop() reads and decodes only the segments its box covers; recently decoded ones are
+    kept for the neighbouring crops (two rows of crops' worth plus a segment row, enough
+    for the tiles in flight to straddle a row boundary), and a segment another worker is
+    decoding is waited for, not decoded twice - so a row-major split decodes each segment
+    once. Reads are serialized, decodes are not.
+    """
+
+    def __init__(self, input_path: str):
+        self._tif = _TT.TiffFile(input_path)
+        try:
+            page = self._tif.pages.first
+            if (page.axes not in ("YX", "YXS") or page.is_memmappable or page.shaped[1] != 1
+                    or (page.samplesperpixel > 1 and page.planarconfig != 1)):
+                raise ValueError("not a contiguous 2-D page")
+            self._shape = page.shape
+            self.dtype = page.dtype
+            self._seg_h, self._seg_w = page.chunks[:2]
+            self._cols = -(-page.imagewidth // self._seg_w)
+            if len(page.dataoffsets) != self._cols * -(-page.imagelength // self._seg_h):
+                raise ValueError("unexpected segment layout")
+            self._offsets, self._counts = page.dataoffsets, page.databytecounts
+            self._decode, self._jpegtables = page.decode, page.jpegtables
+            self.size = (page.imagewidth, page.imagelength)
+            self._lock = threading.Lock()  # file position + cache
+            self._cache: "OrderedDict[int, np.ndarray]" = OrderedDict()
+            self._loading: Dict[int, threading.Event] = {}  # segments being decoded right now
+            self._cap = 0  # segments kept; grows to fit the tallest crop
+            self._segment(0)  # fail here, not mid-split, if the codec isn't available
+        except Exception:
+            self._tif.close()
+            raise
+
+    def _segment(self, i: int) -> np.ndarray:
+        fh = self._tif.filehandle
+        while True:
+            with self._lock:
+                seg = self._cache.get(i)
+                if seg is not None:
+                    self._cache.move_to_end(i)
+                    return seg
+                busy = self._loading.get(i)
+                if busy is None:
+                    data = None
+                    if self._counts[i]:
+                        fh.seek(self._offsets[i])
+                        data = fh.read(self._counts[i])
+                    busy = self._loading[i] = threading.Event()
+                    break
+            busy.wait()  # another worker is decoding it (a strip is shared by a whole row of tiles)
+        try:
+            if data is None:  # sparse file: segment never written
+                seg = np.zeros((self._seg_h, self._seg_w) + self._shape[2:], dtype=self.dtype)
+            else:
+                seg = self._decode(data, i, jpegtables=self._jpegtables)[0]
+                seg = seg.reshape(seg.shape[1:3] + self._shape[2:])  # (1, h, w, S) -> h x w (x S)
+            with self._lock:
+                self._cache[i] = seg
+                while len(self._cache) > max(self._cap, 1):
+                    self._cache.popitem(last=False)
+        finally:
+            with self._lock:
+                del self._loading[i]
+            busy.set()  # waiters re-check the cache (and decode it themselves if this failed)
+        return seg
+
+    def crop(self, box: Tuple[int, int, int, int]) -> np.ndarray:
+        x, y, x2, y2 = box
+        sh, sw = self._seg_h, self._seg_w
+        r0, r1, c0, c1 = y // sh, (y2 - 1) // sh, x // sw, (x2 - 1) // sw
+        self._cap = max(self._cap, self._cols * (2 * (r1 - r0 + 1) + 1))
+        out = np.empty((y2 - y, x2 - x) + self._shape[2:], dtype=self.dtype)
+        for r in range(r0, r1 + 1):
+            ya, yb = max(y, r * sh), min(y2, (r + 1) * sh)
+            for c in range(c0, c1 + 1):
+                xa, xb = max(x, c * sw), min(x2, (c + 1) * sw)
+                seg = self._segment(r * self._cols + c)
+                out[ya - y:yb - y, xa - x:xb - x] = seg[ya - r * sh:yb - r * sh, xa - c * sw:xb - c * sw]
+        return out
+
+    def load(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self._cache.clear()
+        self._tif.close()
+
+
+def _tiff_page_array(input_path: str, memmap: bool) -> Optional[np.ndarray]:
+    """First TIFF page as H x W (x C): a read-only memmap of the file (None unless uncompressed
+    and contiguous) or, with memmap=False, decoded. None for other layouts."""
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        with _TT.TiffFile(input_path) as tif:
+            page = tif.pages.first
+            axes = page.axes
+            if axes not in ("YX", "YXS", "SYX") or (memmap and not page.is_memmappable):
+                return None
+            arr = _TT.memmap(input_path, page=0, mode="r") if memmap else page.asarray()
+    return np.moveaxis(arr, 0, -1) if axes == "SYX" else arr
+
+
+def _png_plain_layout(input_path: str) -> bool:
+    """
+    True for an 8/16-bit gray / gray+alpha / RGB / RGBA PNG without tRNS, read from the
+    chunk headers before the first IDAT: imagecodecs decodes those to the bands Pillow
+    has (it expands palettes, low bit depths and tRNS differently).
+    """
+    with open(input_path, "rb") as f:
+        if f.read(8) != b"\x89PNG\r\n\x1a\n":
+            return False
+        while True:
+            head = f.read(8)
+            if len(head) < 8:
+                return False
+            n, tag = struct.unpack(">I4s", head)
+            if tag == b"IHDR":
+                ihdr = f.read(n)
+                if len(ihdr) < 10 or ihdr[8] not in (8, 16) or ihdr[9] not in (0, 2, 4, 6):
+                    return False
+                f.seek(4, 1)
+            elif tag == b"tRNS":
+                return False
+            elif tag == b"IDAT":
+                return True
+            else:
+                f.seek(n + 4, 1)
+
+
+def _open_split_source(input_path: str) -> Union[Image.Image, _ArraySource, _TiffSegmentSource]:
+    """
+    Open a split input. TIFFs go through tifffile when it's installed: memory-mapped if
+    uncompressed (crops read only the rows they cover), else read per tile / strip
+    (_TiffSegmentSource), else decoded once. Either way the full bit depth and band
+    count are kept (Pillow reads 16-bit RGB as 8-bit and can't open >4 bands). Plain
+    PNGs are decoded once by imagecodecs, for the same 16-bit reason.
+    Everything else, and layouts neither can hand over as H x W (x C), opens with Pillow.
+    """
+    if HAS_IMAGECODECS and input_path.lower().endswith(".png"):
+        try:
+            if _png_plain_layout(input_path):
+                return _ArraySource(_IC.imread(input_path))
+        except Exception:
+            pass
+    if HAS_TIFFILE and input_path.lower().endswith((".tif", ".tiff")):
+        try:
+            arr = _tiff_page_array(input_path, memmap=True)
+            if arr is not None:
+                return _ArraySource(arr)
+        except Exception:
+            pass
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                return _TiffSegmentSource(input_path)
+        except Exception:
+            pass
+        try:
+            arr = _tiff_page_array(input_path, memmap=False)
+            if arr is not None:
+                return _ArraySource(arr)
+        except Exception:
+            pass
+    return Image.open(input_path)
+
+
+def _contiguous_slice(idx) -> Optional[slice]:
+    """slice(a, b) if idx is exactly a, a+1, ..., b-1 (band selection can then be a view), else None."""
+    idx = [int(b) for b in idx]
+    if idx and idx == list(range(idx[0], idx[0] + len(idx))):
+        return slice(idx[0], idx[0] + len(idx))
+    return None
+
+
+def _band_indexer(selected_bands: Optional[List[int]]) -> Optional[Union[slice, np.ndarray]]:
+    """
+    Selected bands as a last-axis indexer, resolved once per split: None (all bands),
+    a slice for a consecutive run like [0, 1, 2] (per-tile selection is then a view),
+    else an intp index array (gathered with take).
+    """
+    if not selected_bands:
+        return None
+    return _contiguous_slice(selected_bands) or np.asarray(selected_bands, dtype=np.intp)
+
+
+def _leading_source_bands(im, bands: Optional[Union[slice, np.ndarray]], k: int) -> Tuple[Union[slice, np.ndarray], np.ndarray]:
+    """
+    Band indexer (+ the same as an intp array) for the source bands behind the first k
+    channels _extract_crop_as_uint8(im, ..., bands) returns, applying its rule that a
+    selection the image can't satisfy is ignored. Used once per source.
+    """
+    probe = np.asarray(im.crop((0, 0, 1, 1)))
+    n = probe.shape[2] if probe.ndim == 3 else 1
+    src = list(range(n))
+    if isinstance(bands, slice):
+        if n >= bands.stop:
+            src = src[bands]
+    elif bands is not None and n > bands.max():
+        src = bands.tolist()
+    kept = src[:k]
+    return _band_indexer(kept), np.asarray(kept, dtype=np.intp)
+
+
 def _apply_band_selection(arr: np.ndarray, selected_bands: Optional[List[int]]) -> np.ndarray:
     if arr.ndim == 2 or not selected_bands:
         return arr
@@ -50,32 +314,221 @@ def _apply_band_selection(arr: np.ndarray, selected_bands: Optional[List[int]])
     return arr[:, :, selected_bands]
 
 
-def _normalize_to_uint8(arr: np.ndarray, mode: str = "minmax") -> np.ndarray:
-    """Normalize to uint8. mode: 'minmax' (per-channel) or 'clip' (0..255)."""
+def _minmax_span(mn: np.ndarray, mx: np.ndarray) -> np.ndarray:
+    """
+    float32 per-channel mx - mn, 0 for constant (or NaN) channels. Pixels are scaled as
+    (v - mn) / span * 255 in float32, the original formula's rounding (a precomputed
+    255 / span factor moves some pixels up a level): mx lands on exactly 255 and
+    nothing goes past it, so no clip is needed.
+    """
+    return np.where(mx > mn, mx - mn, 0).astype(np.float32)
+
+
+_MINMAX_BLOCK_BYTES = 1 << 20  # row-block size for _band_minmax: fits L2 across the band passes
+_MINMAX_SERIAL_PIXELS = 1 << 16  # below this a parallel launch costs more than the work (~15 us)
+_NUMBA_LOCK = threading.Lock()  # one parallel launch at a time (each already uses all cores)
+
+if HAS_NUMBA:
+    @njit(parallel=True, cache=True)
+    def _band_minmax(src, idx, mn, mx):
+        """
+        mn[b, c], mx[b, c] = float32 min / max of src[..., idx[c]] over row block b of
+        mn.shape[0]; NaN if the block has a NaN. Blocks run in parallel, and are small
+        enough that the per-band passes over one block hit cache.
+        """
+        H, W = src.shape[0], src.shape[1]
+        nb = mn.shape[0]
+        for b in prange(nb):
+            y0 = b * H // nb
+            y1 = (b + 1) * H // nb
+            for c in range(idx.shape[0]):
+                s = idx[c]
+                lo = np.float32(src[y0, 0, s])
+                hi = lo
+                for y in range(y0, y1):
+                    for x in range(W):
+                        v = np.float32(src[y, x, s])
+                        if v < lo:
+                            lo = v
+                        elif v > hi:
+                            hi = v
+                        elif v != v:
+                            lo = v  # NaN sticks: no later comparison can replace it
+                            hi = v
+                mn[b, c] = lo
+                mx[b, c] = hi
+
+    @njit(parallel=True, cache=True)
+    def _scale_bands_u8(src, idx, mn, span, out):
+        """out[..., c] = uint8((src[..., idx[c]] - mn[c]) / span[c] * 255) in float32, rows in parallel."""
+        H, W = src.shape[0], src.shape[1]
+        for y in prange(H):
+            for c in range(idx.shape[0]):
+                s = idx[c]
+                lo = mn[c]
+                d = span[c]
+                if d == 0:
+                    for x in range(W):
+                        out[y, x, c] = 0
+                else:
+                    for x in range(W):
+                        out[y, x, c] = np.uint8((np.float32(src[y, x, s]) - lo) / d * np.float32(255.0))
+
+    # same kernels compiled serially (prange runs as range) and without the GIL: small
+    # tiles skip the parallel launch and the pool's workers run them side by side
+    _band_minmax_serial = njit(nogil=True, cache=True)(_band_minmax.py_func)
+    _scale_bands_u8_serial = njit(nogil=True, cache=True)(_scale_bands_u8.py_func)
+
+
+def _numba_minmax_ok(arr: np.ndarray) -> bool:
+    """Whether _minmax_bands_u8 can take arr (numba installed, plain numeric dtype)."""
+    return (HAS_NUMBA and arr.dtype.kind in "iuf" and arr.dtype != np.float16
+            and arr.dtype.isnative and arr.ndim in (2, 3))
+
+
+def _minmax_bands_u8(src: np.ndarray, idx: np.ndarray) -> np.ndarray:
+    """
+    numba min-max of src[..., idx] (src H x W x C, idx intp) -> H x W x len(idx) uint8,
+    without float32 working copies. Same float32 arithmetic, and so the same bytes,
+    as the NumPy path of _normalize_to_uint8.
+    """
+    n = idx.shape[0]
+    H = src.shape[0]
+    if H * src.shape[1] < _MINMAX_SERIAL_PIXELS:
+        mn = np.empty((1, n), dtype=np.float32)
+        mx = np.empty((1, n), dtype=np.float32)
+        out = np.empty(src.shape[:2] + (n,), dtype=np.uint8)
+        _band_minmax_serial(src, idx, mn, mx)
+        _scale_bands_u8_serial(src, idx, mn[0], _minmax_span(mn[0], mx[0]), out)
+        return out
+    row_bytes = max(1, src[:1].nbytes)
+    nb = min(H, max(4 * _NB.get_num_threads(), -(-H * row_bytes // _MINMAX_BLOCK_BYTES)))
+    mn = np.empty((nb, n), dtype=np.float32)
+    mx = np.empty((nb, n), dtype=np.float32)
+    out = np.empty(src.shape[:2] + (n,), dtype=np.uint8)
+    with _NUMBA_LOCK:
+        _band_minmax(src, idx, mn, mx)
+        mn, mx = mn.min(axis=0), mx.max(axis=0)  # NaN in any block propagates
+        _scale_bands_u8(src, idx, mn, _minmax_span(mn, mx), out)
+    return out
+
+
+NORMALIZE_MODES = ("minmax", "global_minmax", "percentile", "clip")
+_PERCENTILE_RANGE = (2.0, 98.0)  # 'percentile' stretch: per-channel low / high cut points
+_GLOBAL_SAMPLE_SIDE = 1024  # 'global_minmax': the scene is sampled on about this many rows / columns
+
+
+def _channel_min_max(src: np.ndarray, k: int = 64) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Per-channel (min, max) of H x W x C src. For C-contiguous input the pixels are reduced
+    k at a time as rows of k*C values: NumPy's axis reductions vectorize along a wide
+    contiguous row, but crawl over a C-wide one (10-50x slower for 3 bands).
+    """
+    if not src.flags.c_contiguous:
+        return src.min(axis=(0, 1)), src.max(axis=(0, 1))
+    C = src.shape[2]
+    flat = src.reshape(-1, C)
+    n = flat.shape[0] // k * k
+    if n == 0:
+        return flat.min(axis=0), flat.max(axis=0)
+    rows = flat[:n].reshape(-1, k * C)
+    lo = rows.min(axis=0).reshape(k, C).min(axis=0)
+    hi = rows.max(axis=0).reshape(k, C).max(axis=0)
+    if n < flat.shape[0]:
+        np.minimum(lo, flat[n:].min(axis=0), out=lo)
+        np.maximum(hi, flat[n:].max(axis=0), out=hi)
+    return lo, hi
+
+
+def _sample_band_ranges(im: Union[Image.Image, _ArraySource, _TiffSegmentSource]) -> np.ndarray:
+    """
+    Per-channel [min, max] (2 x C float32) of the whole image for 'global_minmax', from
+    about _GLOBAL_SAMPLE_SIDE evenly spaced rows, each taken every few columns (NaNs
+    ignored). One row crop at a time, so only those rows are read / decoded.
+    """
+    W, H = im.size
+    sy = max(1, -(-H // _GLOBAL_SAMPLE_SIDE))
+    sx = max(1, -(-W // _GLOBAL_SAMPLE_SIDE))
+    rows = [np.asarray(im.crop((0, y, W, y + 1)))[:, ::sx] for y in range(0, H, sy)]
+    sample = np.concatenate(rows)
+    if sample.ndim == 2:
+        sample = sample[:, :, None]
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # all-NaN channel: NaN -> flat -> 0
+        return np.stack([np.nanmin(sample, axis=(0, 1)), np.nanmax(sample, axis=(0, 1))]).astype(np.float32)
+
+
+def _normalize_to_uint8(arr: np.ndarray, mode: str = "minmax", ranges: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Normalize to uint8. mode: 'minmax' (per-channel), 'global_minmax' (per-channel over
+    the whole image: ranges is its 2 x C [min, max] from _sample_band_ranges, values
+    outside clipped; without ranges the same as 'minmax'), 'percentile' (per-channel
+    2nd..98th percentile stretch, values outside clipped; a few hot or dead pixels can't
+    squash the rest of the range, NaN pixels are ignored and come out 0) or 'clip' (0..255).
+    """
     if arr.dtype == np.uint8:
         return arr
-    if mode not in ("minmax", "clip"):
+    if mode not in NORMALIZE_MODES or (mode == "global_minmax" and ranges is None):
         mode = "minmax"
 
-    if arr.ndim == 2:
+    if mode == "minmax" and _numba_minmax_ok(arr):
+        src = arr if arr.ndim == 3 else arr[:, :, None]
+        out = _minmax_bands_u8(src, np.arange(src.shape[2], dtype=np.intp))
+        return out if arr.ndim == 3 else out[:, :, 0]
+
+    # at most one float32 working copy, all channels at once (2-D and H x W x C alike)
+    if mode == "clip":
+        if arr.dtype.kind in "iu" and arr.dtype.itemsize > 1:
+            # integers clip exactly in their own dtype, cast on the way out: no float copy.
+            # Bounds as arr's own scalar type: with Python ints, unsigned arrays miss the
+            # fast clip loop (uint16 ~6x slower).
+            lo, hi = arr.dtype.type(0), arr.dtype.type(255)
+            return np.clip(arr, lo, hi, out=np.empty(arr.shape, dtype=np.uint8), casting="unsafe")
         a = arr.astype(np.float32)
-        if mode == "minmax":
-            mn, mx = float(a.min()), float(a.max())
-            a = (a - mn) / (mx - mn) * 255.0 if mx > mn else np.zeros_like(a)
-        else:
-            a = np.clip(a, 0, 255)
+        np.clip(a, 0, 255, out=a)
         return a.astype(np.uint8)
 
-    H, W, C = arr.shape
-    out = np.empty((H, W, C), dtype=np.uint8)
-    for c in range(C):
-        a = arr[..., c].astype(np.float32)
-        if mode == "minmax":
-            mn, mx = float(a.min()), float(a.max())
-            a = (a - mn) / (mx - mn) * 255.0 if mx > mn else np.zeros_like(a)
+    a = arr.astype(np.float32)
+    if mode == "global_minmax":
+        # fixed for the whole split, so every tile is on the same scale (the sample may
+        # have missed a more extreme value: those are clipped like the percentile cuts)
+        mn, mx = ranges[0], ranges[1]
+    elif mode == "percentile":
+        # stats from the source values; NaN pixels (float nodata) are left out, so one
+        # of them can't turn the whole channel flat. An all-NaN channel stays NaN -> 0
+        if arr.dtype.kind == "f":
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", RuntimeWarning)
+                mn, mx = np.nanpercentile(arr, _PERCENTILE_RANGE, axis=(0, 1)).astype(np.float32)
         else:
-            a = np.clip(a, 0, 255)
-        out[..., c] = a.astype(np.uint8)
+            mn, mx = np.percentile(arr, _PERCENTILE_RANGE, axis=(0, 1)).astype(np.float32)
+    else:
+        # integer stats straight from arr (cheaper to reduce; rounding to float32 is
+        # monotonic, so they equal the copy's), float ones from the float32 copy
+        src = arr if arr.dtype.kind in "iu" else a
+        mn, mx = _channel_min_max(src) if src.ndim == 3 else (src.min(), src.max())
+        mn, mx = np.float32(mn), np.float32(mx)
+    mn, mx = mn.reshape(-1), mx.reshape(-1)  # per channel (one value for 2-D)
+    flat = ~(mx > mn)  # constant (or NaN) channels -> 0
+    if mode != "minmax" and flat.any():
+        # clamped to 0..0 below, so an all-NaN channel's NaNs don't reach the multiply
+        mn, mx = np.where(flat, np.float32(0), mn), np.where(flat, np.float32(0), mx)
+    # the copy as H rows of W*C values, per-channel constants tiled along a row: against
+    # (1, 1, C) stats NumPy's inner loop would run over just C values (~8x slower)
+    rows = a.reshape(a.shape[0], -1)
+    reps = rows.shape[1] // mn.size
+    lo = np.tile(mn, reps)
+    if mode != "minmax":
+        # percentile / global_minmax: clamped to [mn, mx], then a min-max stretch over it.
+        # fmax / fmin rather than clip: they also turn NaN pixels into the low end (0)
+        np.fmin(np.fmax(rows, lo, out=rows), np.tile(mx, reps), out=rows)
+    rows -= lo
+    # (v - mn) / span * 255 (see _minmax_span); flat channels divide by 1, zeroed below
+    rows /= np.tile(np.where(flat, np.float32(1), _minmax_span(mn, mx)), reps)
+    out = np.empty(a.shape, dtype=np.uint8)
+    np.multiply(rows, np.float32(255.0), out=out.reshape(rows.shape), casting="unsafe")
+    if flat.any():
+        out.reshape(rows.shape)[:, np.tile(flat, reps)] = 0
     return out
 
 
@@ -108,50 +561,370 @@ def _ensure_format_compat(arr: np.ndarray, extension: str, policy: str = "auto")
 
 
 def _save_kwargs_for_ext(ext: str) -> Dict[str, Any]:
+    """
+    Encoder options per tile format, tuned for throughput (tile sets are intermediate data):
+    PNG zlib level 1 (~3x faster than the default 6, ~10% larger), JPEG without the extra
+    Huffman-optimization pass (~4x faster, ~4% larger; same quality), TIFF LZW (already
+    faster than deflate; only used by the Pillow fallback, see _tile_saver), WEBP at
+    libwebp's fastest method (~4x faster, ~15% larger).
+    """
     ext = (ext or "").lower()
     if not ext.startswith("."):
         ext = "." + ext
     if ext in (".jpg", ".jpeg"):
-        return {"quality": 95, "optimize": True}
+        return {"quality": 95}
     if ext in (".tif", ".tiff"):
         return {"compression": "tiff_lzw"}
+    if ext == ".png":
+        return {"compress_level": 1}
+    if ext == ".webp":
+        return {"method": 0}
     return {}
 
 
+# fields allowed in name patterns; row/col are aliases of y/x
+_NAME_FIELDS = {"base": 0, "y": 1, "x": 2, "row": 1, "col": 2, "i": 3, "ext": 4}
+
+
+@functools.lru_cache(maxsize=32)
+def _compile_name_pattern(pattern: str, ext: str) -> Callable[[str, int, int, int], str]:
+    """
+    Parse a tile name pattern like '{base}_tile_{y}_{x}' once and return
+    name(base, y, x, i) -> file name (with ext appended unless the pattern already ends with it).
+    Format specs / conversions work as in str.format ('{i:05d}', '{base!s}').
+    Unknown or positional fields raise ValueError here instead of on the first tile.
+    Memoized: the same (pattern, ext) returns the same function.
+    """
+    # rewrite named fields to positional ones -> a single str.format call per tile
+    fmt = []
+    parts = list(string.Formatter().parse(pattern))
+    for literal, field, spec, conv in parts:
+        fmt.append(literal.replace("{", "{{").replace("}", "}}"))
+        if field is None:
+            continue
+        if field not in _NAME_FIELDS:
+            raise ValueError(f"Unknown field {{{field}}} in name pattern {pattern!r}; "
+                             f"use {', '.join('{' + k + '}' for k in _NAME_FIELDS)}.")
+        fmt.append("{%d%s%s}" % (_NAME_FIELDS[field], "!" + conv if conv else "", ":" + spec if spec else ""))
+    fmt = "".join(fmt).format
+    ext_bare = ext.lstrip(".")
+    ext_l = ext.lower()
+
+    # a bare {y} / {x} / {i} at the end formats as digits, which never end with '.ext'
+    ends_with_int = (bool(parts) and parts[-1][1] in ("y", "x", "row", "col", "i")
+                     and not (parts[-1][2] or parts[-1][3]))
+    if pattern.lower().endswith(ext_l):
+        # literal extension at the end: the suffix test is the same for every tile
+        def name(base: str, y: int, x: int, i: int) -> str:
+            return fmt(base, y, x, i, ext_bare)
+    elif ends_with_int and "." in ext_l:
+        def name(base: str, y: int, x: int, i: int) -> str:
+            return fmt(base, y, x, i, ext_bare) + ext
+    else:
+        def name(base: str, y: int, x: int, i: int) -> str:
+            out = fmt(base, y, x, i, ext_bare)
+            return out if out.lower().endswith(ext_l) else out + ext
+
+    return name
+
+
+_UINT8_MODES = {1: "L", 2: "LA", 3: "RGB", 4: "RGBA"}  # uint8 H x W x C -> PIL mode
+
+
+def _array_to_image(arr: np.ndarray) -> Image.Image:
+    """
+    Array -> PIL image, making the array C-contiguous first only if it isn't (e.g. a
+    channel slice); Pillow would otherwise go through tobytes() + a second copy.
+    uint8 tiles (everything the splitter writes) go straight to Image.frombuffer with
+    the mode from a table lookup, skipping fromarray's __array_interface__ parsing;
+    L / RGBA then share the array's memory, RGB / LA are unpacked once.
+    """
+    if not arr.flags["C_CONTIGUOUS"]:
+        arr = np.ascontiguousarray(arr)
+    if arr.dtype == np.uint8:
+        mode = "L" if arr.ndim == 2 else _UINT8_MODES.get(arr.shape[2]) if arr.ndim == 3 else None
+        if mode:
+            return Image.frombuffer(mode, (arr.shape[1], arr.shape[0]), arr, "raw", mode, 0, 1)
+    return Image.fromarray(arr)
+
+
+def _is_constant_tile(arr: np.ndarray) -> bool:
+    """
+    True if every pixel of the tile equals the first one (blank border / padding).
+    A strided sample is compared first, so a tile with content is rejected cheaply.
+    """
+    px = arr.reshape(arr.shape[0], arr.shape[1], -1)
+    first = px[0, 0]
+    return bool((px[::8, ::8] == first).all() and (px == first).all())
+
+
+def _tile_count(H: int, W: int, step: int) -> int:
+    """Number of tiles _iter_coords yields, by arithmetic."""
+    return len(range(0, H, step)) * len(range(0, W, step))
+
+
+def _iter_coords(H: int, W: int, tile_size: int, step: int) -> Iterator[Tuple[int, int, int, int]]:
+    """
+    (y, x, y2, x2) per tile as plain ints, row-major, edges clamped to the image. Lazy: only
+    the column bounds (W / step pairs) are built up front, never the whole grid (hundreds
+    of millions of tiles on a gigapixel input).
+    """
+    cols = [(x, min(x + tile_size, W)) for x in range(0, W, step)]
+    for y in range(0, H, step):
+        y2 = min(y + tile_size, H)
+        for x, x2 in cols:
+            yield y, x, y2, x2
+
+
+def _tiff_tile_bytes(arr: np.ndarray) -> bytes:
+    """uint8 H x W (x 1-4) -> TIFF file bytes; photometric / extra samples as Pillow writes L, LA, RGB, RGBA."""
+    c = 1 if arr.ndim == 2 else arr.shape[2]
+    buf = io.BytesIO()
+    _TT.imwrite(buf, arr if c > 1 else arr.reshape(arr.shape[:2]),
+                photometric="rgb" if c >= 3 else "minisblack",
+                extrasamples=[2] if c in (2, 4) else None,  # unassociated alpha
+                compression="zlib", compressionargs={"level": 1}, predictor=True, metadata=None)
+    return buf.getvalue()
+
+
+def _tile_saver(ext: str, save_kwargs: dict) -> Callable[[np.ndarray, str], None]:
+    """
+    Encode + write for one tile format, resolved once per split: save(arr, path) runs
+    on the worker pool (the encoders release the GIL). 8-bit JPEG / PNG tiles go straight
+    from the array through imagecodecs, skipping the PIL image: JPEG through the same
+    libjpeg-turbo (byte-identical output), PNG through its libpng / zlib-ng encoder (~35%
+    faster at level 1, same pixels and size), RGB / RGBA WEBP through the same libwebp
+    (byte-identical; ~2x faster for RGB, which Pillow first widens to RGBA). 8-bit TIFF tiles are written by tifffile as
+    deflate level 1 + horizontal predictor: ~30% faster than Pillow's LZW and ~45% smaller,
+    still baseline-readable (Pillow, libtiff, GDAL). The rest goes through Pillow, with
+    the format looked up here rather than from each file name.
+    """
+    ext = ext.lower()
+    encode, channels = None, ()
+    if HAS_IMAGECODECS:
+        if ext in (".tif", ".tiff") and HAS_TIFFILE and set(save_kwargs) <= {"compression"}:
+            encode = _tiff_tile_bytes
+            channels = (1, 2, 3, 4)
+        elif ext in (".jpg", ".jpeg") and set(save_kwargs) <= {"quality"}:
+            encode = functools.partial(_IC.jpeg8_encode, level=save_kwargs.get("quality", 75))
+            channels = (1, 3)
+        elif ext == ".png" and set(save_kwargs) <= {"compress_level"}:
+            encode = functools.partial(_IC.png_encode, level=save_kwargs.get("compress_level", 6))
+            channels = (1, 2, 3, 4)
+        elif ext == ".webp" and set(save_kwargs) <= {"quality", "method"}:
+            # Pillow's defaults (lossy, quality 80, method 4); gray / LA stay on Pillow,
+            # which stores them as RGB(A)
+            encode = functools.partial(_IC.webp_encode, level=save_kwargs.get("quality", 80),
+                                       lossless=False, method=save_kwargs.get("method", 4))
+            channels = (3, 4)
+    fmt = Image.registered_extensions().get(ext)  # None: let Pillow decide (and complain)
+
+    def save(arr: np.ndarray, path: str) -> None:
+        if (encode is not None and arr.dtype == np.uint8
+                and ((1 if arr.ndim == 2 else arr.shape[2]) in channels)):
+            data = encode(np.ascontiguousarray(arr))
+            with open(path, "wb") as f:
+                f.write(data)
+            return
+        _array_to_image(arr).save(path, format=fmt, **save_kwargs)
+
+    return save
+
+
+_PARQUET_BATCH_ROWS = 1 << 16  # manifest rows per parquet row group (buffered until then)
+_PARQUET_INT_COLUMNS = {"tile_x", "tile_y", "x0", "y0", "w", "h"}
+
+
+class _ManifestWriter:
+    """
+    manifest.csv for one tile folder, written row by row as tiles are confirmed on disk.
+    The file is created on the first row, so a split that writes no tiles leaves none.
+    A manifest.parquet copy, if wanted, is streamed too: with pyarrow every
+    _PARQUET_BATCH_ROWS rows go out as a row group, so at most one batch is held in
+    memory; the pandas fallback can't append and gets all rows at close.
+    """
+
+    def __init__(self, folder: str, path_col: str, keep_rows: bool = False):
+        self.folder = folder
+        self.path = os.path.join(folder, "manifest.csv")
+        self.columns = ["scene_id", "tile_x", "tile_y", "x0", "y0", "w", "h", path_col, "label_path", "fold"]
+        self.rows: Optional[List[List[Any]]] = [] if keep_rows else None
+        self.count = 0
+        self._f = None
+        self._w = None
+        self._pq = None  # pyarrow ParquetWriter, opened with the first full batch
+        self._pq_stream = keep_rows  # False once pyarrow turns out to be missing
+
+    def add(self, row: List[Any]) -> None:
+        if self._f is None:
+            # 1 MiB buffer: the rows reach the OS in a few large writes, not one per 8 KiB
+            self._f = open(self.path, "w", newline="", encoding="utf-8", buffering=1 << 20)
+            self._w = csv.writer(self._f)
+            self._w.writerow(self.columns)
+        self._w.writerow(row)
+        self.count += 1
+        if self.rows is not None:
+            self.rows.append(row)
+            if self._pq_stream and len(self.rows) >= _PARQUET_BATCH_ROWS:
+                self._parquet_batch()
+
+    def _parquet_batch(self) -> None:
+        """Buffered rows -> one row group of manifest.parquet. A failure drops only the parquet copy."""
+        path = os.path.join(self.folder, "manifest.parquet")
+        try:
+            if self._pq is None:
+                try:
+                    import pyarrow.parquet as pq
+                except ImportError:
+                    self._pq_stream = False  # keep buffering; pandas writes them all at close
+                    return
+                self._pq = pq.ParquetWriter(path, _parquet_schema(self.columns), compression="zstd")
+            self._pq.write_table(_parquet_table(self.columns, self.rows))
+            self.rows = []
+        except Exception:
+            self.rows = None
+            self._pq_stream = False
+            if self._pq is not None:
+                try:
+                    self._pq.close()
+                    os.remove(path)
+                except Exception:
+                    pass
+                self._pq = None
+
+    def close(self) -> Optional[str]:
+        """Finish the CSV (+ parquet if asked); returns the CSV path, or None if no rows."""
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+            if self._pq is not None:
+                if self.rows:
+                    self._parquet_batch()
+                if self._pq is not None:
+                    try:
+                        self._pq.close()
+                    except Exception:
+                        pass
+                    self._pq = None
+            elif self.rows:
+                # everything fitted in one batch (or no pyarrow): a single write, as before
+                try:
+                    _write_parquet(os.path.join(self.folder, "manifest.parquet"), self.columns, self.rows)
+                except Exception:
+                    pass
+            if self.rows is not None:
+                self.rows = []
+        return self.path if self.count else None
+
+
+def _parquet_schema(columns: List[str]):
+    """Fixed manifest schema (pyarrow): int64 geometry, strings elsewhere, the same for every row group."""
+    import pyarrow as pa
+    return pa.schema([(c, pa.int64() if c in _PARQUET_INT_COLUMNS else pa.string()) for c in columns])
+
+
+def _parquet_table(columns: List[str], rows: List[List[Any]]):
+    """rows -> pyarrow table, straight from columns (one C-level transpose)."""
+    import pyarrow as pa
+    return pa.table({name: list(col) for name, col in zip(columns, zip(*rows))}, schema=_parquet_schema(columns))
+
+
+def _write_parquet(path: str, columns: List[str], rows: List[List[Any]]) -> None:
+    """
+    rows -> parquet in one go with pyarrow; pandas (with whichever parquet engine it has)
+    only as a fallback. Both are optional.
+    """
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        import pandas as pd
+        pd.DataFrame(rows, columns=columns).to_parquet(path, index=False)
+        return
+    pq.write_table(_parquet_table(columns, rows), path, compression="zstd")
+
+
 # ---------- Internal: stream a crop safely ----------
 def _extract_crop_as_uint8(
-    im: Image.Image,
+    im: Union[Image.Image, _ArraySource, _TiffSegmentSource],
     box: Tuple[int, int, int, int],
-    selected_bands: Optional[List[int]],
+    bands: Optional[Union[slice, np.ndarray]],
     normalize_mode: str,
+    band_idx: Optional[np.ndarray] = None,
+    ranges: Optional[np.ndarray] = None,
 ) -> np.ndarray:
-    crop = im.crop(box)
+    """
+    Crop `box`, pick bands and normalize to uint8.
+    bands: from _band_indexer (None = all bands, slice = view, intp array = gather).
+    Ignored if the image has fewer bands than it asks for.
+    band_idx: bands as an intp array for the numba kernel, if the caller precomputed it.
+    ranges: 'global_minmax' [min, max] of every source band (_sample_band_ranges); the
+    picked bands take theirs along.
+    """
+    # _ArraySource crops are views, _TiffSegmentSource ones are assembled fresh; a Pillow
+    # crop is a fresh image that asarray() copies once more via tobytes() (no zero-copy export)
+    arr = np.asarray(im.crop(box))
+    if bands is not None and arr.ndim == 3:
+        if normalize_mode == "minmax" and arr.dtype != np.uint8 and _numba_minmax_ok(arr):
+            idx = band_idx
+            if idx is None:
+                idx = np.arange(bands.start, bands.stop, dtype=np.intp) if isinstance(bands, slice) else bands
+            if arr.shape[2] > idx.max():
+                # band pick fused into the min-max kernel: no gathered / strided copy at all
+                out = _minmax_bands_u8(arr, idx)
+                return out if out.shape[2] > 1 else out[:, :, 0]
+        if isinstance(bands, slice):
+            if arr.shape[2] >= bands.stop:
+                arr = arr[:, :, bands]  # a view; normalization / saving copies anyway
+                ranges = ranges if ranges is None else ranges[:, bands]
+        elif arr.shape[2] > bands.max():
+            arr = arr.take(bands, axis=2)
+            ranges = ranges if ranges is None else ranges[:, bands]
+        if arr.shape[2] == 1:
+            arr = arr[:, :, 0]  # single band -> gray (as PIL's split gave before)
+    arr = _normalize_to_uint8(arr, mode=normalize_mode, ranges=ranges)
+    return arr
 
-    # حاول نطبّق اختيار القنوات عبر PIL
-    try:
-        if selected_bands is not None:
-            parts = crop.split()
-            if len(parts) >= max(selected_bands) + 1:
-                parts_sel = tuple(parts[i] for i in selected_bands)
-                if len(parts_sel) == 1:
-                    crop = parts_sel[0]
-                elif len(parts_sel) == 3:
-                    crop = Image.merge("RGB", parts_sel[:3])
-                elif len(parts_sel) == 4:
-                    crop = Image.merge("RGBA", parts_sel[:4])
-                else:
-                    crop = Image.merge("RGBA", parts_sel[:4])
-    except Exception:
-        pass
 
-    arr = np.array(crop)
-    if arr.ndim == 3 and selected_bands is not None and arr.shape[2] >= max(selected_bands) + 1:
-        arr = arr[:, :, selected_bands]
-    arr = _normalize_to_uint8(arr, mode=normalize_mode)
-    return arr
+# Pillow modes JPEG / WEBP tiles can't hold as they are, and what to convert them to
+# once per split: palette indices become the colours they stand for, alpha is dropped
+_NO_ALPHA_MODES = {"P": "RGB", "PA": "RGB", "RGBA": "RGB", "LA": "L"}
+
+
+def _drop_unwritable_bands(im, ext: str, selected_bands: Optional[List[int]]) -> Tuple[Any, Optional[str]]:
+    """
+    For JPEG / WEBP tiles, convert a loaded Pillow source that carries a palette or
+    alpha (_NO_ALPHA_MODES) once, up front, instead of cropping, normalizing and then
+    dropping the extra band on every tile. Palette images turn into their colours rather
+    than tiles of raw palette indices. RGBA / LA are left alone when bands are selected,
+    so a selection that picks the alpha band keeps working. Returns (image, note or None).
+    """
+    if ext.lower() not in (".jpg", ".jpeg", ".webp") or not isinstance(im, Image.Image):
+        return im, None
+    mode = _NO_ALPHA_MODES.get(im.mode)
+    if mode is None or (selected_bands and im.mode in ("RGBA", "LA")):
+        return im, None
+    out = im.convert(mode)
+    note = f"{im.mode} image converted to {mode} for {ext}."
+    im.close()
+    return out, note
 
 
 # ---------------- Public splitter (streaming) ----------------
+def _link_tile(src: str, dst: str) -> None:
+    """
+    Put an already written tile at a second path without encoding it again: a hard link
+    (no data copied), or a plain file copy where the filesystem has no hard links.
+    """
+    try:
+        os.link(src, dst)
+    except FileExistsError:
+        # re-split into the same folder: replace the old tile, as a fresh save would
+        os.remove(dst)
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)  # sendfile() in the kernel on Linux
+
+
 def split_large_image(
     input_path: str,
     output_dir: str,
@@ -174,11 +947,22 @@ def split_large_image(
     label_path: str = "",
     fold: str = "train",
     write_parquet: bool = False,
+    # don't write tiles whose every pixel is the same (blank borders / padding)
+    skip_constant: bool = False,
     # progress callback: fn(i:int, total:int) -> bool (return True to cancel)
     progress: Optional[Callable[[int, int], bool]] = None,
+    # tile worker threads: crop, normalize, encode, write (None = one per usable CPU)
+    max_workers: Optional[int] = None,
 ) -> Dict[str, Any]:
     """
     Split image into tiles (crop-by-crop) with optional overlap.
+    Each tile is cropped, normalized, encoded and written by a thread pool task (the
+    images are decoded once up front, so concurrent crops only read them), with at most
+    2*max_workers tiles in flight. Manifest rows keep tile order.
+    skip_constant: tiles that come out as one flat value (after normalization) are not
+    written nor listed; with T2 the T1 tile decides for the pair, so both manifests keep
+    the same positions. The count is returned as "skipped".
+    t2_path naming the input file itself: T2 tiles are hard links to the T1 tiles.
     - يكتب التايلز في مجلدين: output_dir/T1 و output_dir/T2 (لو T2 موجود).
     - يكتب manifest.csv مستقل لكل واحد.
     - اسماء T2 بتستخدم base مختلف عن T1 (حسب t2_base أو base+"_T2").
@@ -195,21 +979,42 @@ def split_large_image(
     base2 = (t2_base or "").strip() or (base1 + "_T2")
 
     ext = extension if extension.startswith(".") else "." + extension
-    save_kwargs = _save_kwargs_for_ext(ext)
+    save_tile = _tile_saver(ext, _save_kwargs_for_ext(ext))
 
     # --- افتح T1 بدون تحميل كامل ---
     try:
-        im1 = Image.open(input_path)
+        im1 = _open_split_source(input_path)
     except Exception as e:
         raise ValueError(f"Could not open image: {input_path}\n{e}")
 
     W, H = im1.size
-    # dtype تقريبي من كروب صغير
+    # dtype from the source (tifffile / imagecodecs metadata) or Pillow's mode, no decode;
+    # only exotic modes fall back to a small crop (which decodes)
+    dtype = getattr(im1, "dtype", None)
+    if dtype is None:
+        dtype = _PIL_MODE_DTYPES.get(getattr(im1, "mode", None))
+    if dtype is None:
+        try:
+            dtype = np.asarray(im1.crop((0, 0, min(W, 32), min(H, 32)))).dtype
+        except Exception:
+            dtype = "unknown"
+    dtype_str = str(dtype)
+    # Decode once, here: Pillow's first crop loads the whole image anyway, and once loaded
+    # crop() only reads it, so the tile workers can crop concurrently (no-op for memmaps).
     try:
-        probe = np.array(im1.crop((0, 0, min(W, 32), min(H, 32))))
-        dtype_str = str(probe.dtype)
-    except Exception:
-        dtype_str = "unknown"
+        im1.load()
+    except Exception as e:
+        im1.close()
+        raise ValueError(f"Could not read image: {input_path}\n{e}")
+    im1, convert_note = _drop_unwritable_bands(im1, ext, selected_bands)
+    # 'global_minmax': each source's band ranges, sampled once before any tile
+    ranges: Dict[int, np.ndarray] = {}
+    if normalize_mode == "global_minmax":
+        try:
+            ranges[id(im1)] = _sample_band_ranges(im1)
+        except Exception as e:
+            im1.close()
+            raise ValueError(f"Could not read image: {input_path}\n{e}")
 
     # أنشئ مجلدات T1/T2
     t1_dir = os.path.join(output_dir, "T1")
@@ -218,10 +1023,26 @@ def split_large_image(
     im2 = None
     t2_used = False
     t2_dir = None
+    # T2 pointing at the input itself: its tiles would come out byte for byte the same,
+    # so they are linked to the T1 tiles instead of decoded and encoded a second time
+    t2_same = False
     if t2_path and os.path.isfile(t2_path):
         try:
-            im2 = Image.open(t2_path)
+            t2_same = os.path.samefile(input_path, t2_path)
+        except OSError:
+            pass
+    if t2_same:
+        t2_dir = os.path.join(output_dir, "T2")
+        os.makedirs(t2_dir, exist_ok=True)
+        t2_used = True
+    elif t2_path and os.path.isfile(t2_path):
+        try:
+            im2 = _open_split_source(t2_path)
             if im2.size == im1.size:
+                im2.load()  # see im1.load() above
+                im2, _ = _drop_unwritable_bands(im2, ext, selected_bands)
+                if normalize_mode == "global_minmax":
+                    ranges[id(im2)] = _sample_band_ranges(im2)  # T2's own ranges (other sensor)
                 t2_dir = os.path.join(output_dir, "T2")
                 os.makedirs(t2_dir, exist_ok=True)
                 t2_used = True
@@ -229,90 +1050,170 @@ def split_large_image(
                 im2.close()
                 im2 = None
         except Exception:
+            if im2 is not None:
+                im2.close()
             im2 = None
             t2_used = False
 
     # --- build coords with overlap ---
     overlap_px = int(round(tile_size * float(overlap_pct) / 100.0))
     step = tile_size if overlap_px <= 0 else max(1, tile_size - overlap_px)
-    coords = [(y, x, min(y + tile_size, H), min(x + tile_size, W))
-              for y in range(0, H, step)
-              for x in range(0, W, step)]
-    total = len(coords)
-
-    # --- manifests ---
-    rows_t1: List[List[Any]] = []
-    rows_t2: List[List[Any]] = []
+    # generated as the loop goes (_iter_coords); the count comes from arithmetic
+    total = _tile_count(H, W, step)
+
+    # --- manifests (واحد لكل فولدر), streamed as tiles land ---
+    # T1 keeps the GUI's default t1_path column; T2 writes t2_path for clarity
+    # (the GUI's manifest merge accepts t1_path / t2_path / path)
+    man1 = _ManifestWriter(t1_dir, "t1_path", write_parquet) if write_manifest else None
+    man2 = _ManifestWriter(t2_dir, "t2_path", write_parquet) if write_manifest and t2_used else None
     scene = (scene_id or base1)
     fold = (fold or "train").lower()
     label_src = label_path or ""
 
     pat1 = name_pattern or "{base}_tile_{y}_{x}"
     pat2 = (name_pattern_t2 if name_pattern_t2 not in (None, "") else pat1)
+    name1 = _compile_name_pattern(pat1, ext)
+    # band selection resolved once for the whole split, not per tile
+    bands = _band_indexer(selected_bands)
+    band_idx = None if bands is None else np.asarray(selected_bands, dtype=np.intp)
+    name2 = _compile_name_pattern(pat2, ext)
+    # folder + separator joined once; per tile the path is one concatenation (os.path.join
+    # re-normalizes both parts on every call, ~10x the cost)
+    t1_prefix = os.path.join(t1_dir, "")
+    t2_prefix = os.path.join(t2_dir, "") if t2_used else ""
 
     tiles = 0
-    info_note: Optional[str] = None
+    skipped = 0
+    info_note: Optional[str] = convert_note
 
-    try:
-        for i, (y, x, y2, x2) in enumerate(coords):
-            if progress and progress(i, total):
-                break
+    n_workers = max(1, int(max_workers or _default_workers()))
+    # submitted tiles, oldest first: (future, is_t2, manifest row, (y, x), (T1 path, T2 path)
+    # to link, or None); a linked T2 entry holds its T1 tile's future
+    pending = deque()
+    # the not yet finished ones among them (each future drops itself when done)
+    inflight = set()
+
+    def _submit(ex, im, box, path, lead=None):
+        fut = ex.submit(_make_tile, im, box, path, lead)
+        inflight.add(fut)
+        fut.add_done_callback(inflight.discard)
+        return fut
+
+    # per source image: (band indexer, band array, note) for every tile after its first.
+    # _ensure_format_compat's answer only depends on the channel count, which is fixed per
+    # source, so it runs once; where the format drops channels, later tiles extract just
+    # the kept bands
+    compat: Dict[int, Tuple[Optional[Union[slice, np.ndarray]], Optional[np.ndarray], Optional[str]]] = {}
+
+    def _make_tile(im: Union[Image.Image, _ArraySource, _TiffSegmentSource], box: Tuple[int, int, int, int], path: str,
+                   lead=None) -> Tuple[bool, Optional[str]]:
+        """
+        Crop + normalize + channel fix + encode/write one tile (pool thread); returns
+        (written, format note). lead: with skip_constant, the T1 tile's future for a T2 tile,
+        whose skip it follows. The loop below always submits T1 before its T2, and T1 waits on
+        nothing, so the wait can't deadlock: T1 is running or done by the time T2 is dequeued.
+        """
+        if lead is not None and not lead.result()[0]:
+            return False, None
+        x, y = box[0], box[1]
+        try:
+            fix = compat.get(id(im))
+            if fix is None:
+                arr = _extract_crop_as_uint8(im, box, bands, normalize_mode, band_idx, ranges.get(id(im)))
+                fixed, info = _ensure_format_compat(arr, ext, policy=policy)  # raises for policy != 'auto'
+                # only the channels the format keeps are cropped and normalized from now
+                # on (each channel is normalized on its own, so the bytes are the same)
+                kept = _leading_source_bands(im, bands, fixed.shape[2]) if fixed is not arr else (bands, band_idx)
+                fix = compat[id(im)] = (*kept, info.get("note"))
+                arr = fixed
+            else:
+                arr = _extract_crop_as_uint8(im, box, fix[0], normalize_mode, fix[1], ranges.get(id(im)))
+        except MemoryError as me:
+            raise MemoryError(f"Out of memory while processing tile ({y},{x}). Try smaller tile_size.\n{me}")
+        except Exception as e:
+            raise RuntimeError(f"Failed to generate tile at ({y},{x}): {e}")
+        if skip_constant and _is_constant_tile(arr):
+            return False, fix[2]
+        save_tile(arr, path)
+        return True, fix[2]
 
-            # --- T1 ---
+    def _settle(item) -> None:
+        nonlocal tiles, skipped, info_note
+        fut, is_t2, row, yx, link = item
+        if is_t2:
             try:
-                tile_arr = _extract_crop_as_uint8(im1, (x, y, x2, y2), selected_bands, normalize_mode)
-                tile_arr, info = _ensure_format_compat(tile_arr, ext, policy=policy)
-                if not info_note and "note" in info:
-                    info_note = info["note"]
-            except MemoryError as me:
-                raise MemoryError(f"Out of memory while processing tile ({y},{x}). Try smaller tile_size.\n{me}")
+                written, _ = fut.result()
+                if written and link is not None:
+                    _link_tile(*link)
             except Exception as e:
-                raise RuntimeError(f"Failed to generate tile at ({y},{x}): {e}")
+                if not info_note:
+                    info_note = f"T2 tile failed at {yx}: {e}"
+                return
+            if written and man2 is not None:
+                man2.add(row)
+        else:
+            written, note = fut.result()  # a failed T1 tile aborts the split, as before
+            if note and not info_note:
+                info_note = note
+            if not written:
+                skipped += 1
+                return
+            if man1 is not None:
+                man1.add(row)
+            tiles += 1
 
-            fname1 = pat1
+    try:
+        # every tile (T1 and T2 alike) is cropped, normalized and written by a pool task;
+        # this thread only names tiles and keeps manifest rows in order
+        with ThreadPoolExecutor(max_workers=n_workers) as ex:
             try:
-                fname1 = fname1.format(i=i)
-            except Exception:
-                pass
-            fname1 = fname1.format(base=base1, y=y, x=x, row=y, col=x, ext=ext.lstrip("."))
-            if not fname1.lower().endswith(ext):
-                fname1 = f"{fname1}{ext}"
-
-            t1_path = os.path.join(t1_dir, fname1)
-            Image.fromarray(tile_arr).save(t1_path, **save_kwargs)
-
-            # manifest T1
-            tile_x = x // step
-            tile_y = y // step
-            w = int(x2 - x)
-            h = int(y2 - y)
-            if write_manifest:
-                rows_t1.append([scene, tile_x, tile_y, x, y, w, h, t1_path, label_src, fold])
-
-            # --- T2 (إن وُجد) ---
-            if t2_used and im2 is not None:
-                try:
-                    tile2 = _extract_crop_as_uint8(im2, (x, y, x2, y2), selected_bands, normalize_mode)
-                    tile2, _ = _ensure_format_compat(tile2, ext, policy=policy)
-                    fname2 = pat2
-                    try:
-                        fname2 = fname2.format(i=i)
-                    except Exception:
-                        pass
-                    fname2 = fname2.format(base=base2, y=y, x=x, row=y, col=x, ext=ext.lstrip("."))
-                    if not fname2.lower().endswith(ext):
-                        fname2 = f"{fname2}{ext}"
+                for i, (y, x, y2, x2) in enumerate(_iter_coords(H, W, tile_size, step)):
+                    if progress and progress(i, total):
+                        break
 
-                    t2_tile_path = os.path.join(t2_dir, fname2)
-                    Image.fromarray(tile2).save(t2_tile_path, **save_kwargs)
+                    # --- T1 ---
+                    t1_path = t1_prefix + name1(base1, y, x, i)
 
-                    if write_manifest:
-                        rows_t2.append([scene, tile_x, tile_y, x, y, w, h, t2_tile_path, label_src, fold])
-                except Exception as e:
-                    if not info_note:
-                        info_note = f"T2 tile failed at ({y},{x}): {e}"
+                    # manifest T1
+                    tile_x = x // step
+                    tile_y = y // step
+                    w = int(x2 - x)
+                    h = int(y2 - y)
+                    fut1 = _submit(ex, im1, (x, y, x2, y2), t1_path)
+                    pending.append((fut1, False,
+                                    [scene, tile_x, tile_y, x, y, w, h, t1_path, label_src, fold], (y, x),
+                                    None))
 
-            tiles += 1
+                    # --- T2 (إن وُجد) ---
+                    if t2_used:
+                        t2_tile_path = t2_prefix + name2(base2, y, x, i)
+                        if t2_same:
+                            # linked when settled, right after its T1 tile (same skip decision)
+                            fut2, link = fut1, (t1_path, t2_tile_path)
+                        else:
+                            fut2, link = _submit(ex, im2, (x, y, x2, y2), t2_tile_path,
+                                                     fut1 if skip_constant else None), None
+                        pending.append((fut2, True,
+                                        [scene, tile_x, tile_y, x, y, w, h, t2_tile_path, label_src, fold],
+                                        (y, x), link))
+
+                    # bounded: at most ~2 unfinished tiles per worker (decoded crops held in
+                    # RAM), waiting for whichever finishes first, so one slow tile at the head
+                    # doesn't idle the other workers
+                    while len(inflight) >= 2 * n_workers:
+                        wait(inflight.copy(), return_when=FIRST_COMPLETED)
+                    # finished tiles are settled from the head, in order (manifest order);
+                    # a head tile still running only blocks once many tiles are waiting on it
+                    while pending and (pending[0][0].done() or len(pending) >= 64 * n_workers):
+                        _settle(pending.popleft())
+
+                # cancelled or done: everything submitted is finished before the manifests
+                while pending:
+                    _settle(pending.popleft())
+            except BaseException:
+                for fut, *_ in pending:
+                    fut.cancel()  # queued writes are dropped; running ones finish on exit
+                raise
     finally:
         try:
             im1.close()
@@ -323,47 +1224,9 @@ def split_large_image(
                 im2.close()
         except Exception:
             pass
-
-    # ---- write manifests (واحد لكل فولدر) ----
-    t1_manifest = None
-    t2_manifest = None
-    if write_manifest and rows_t1:
-        t1_manifest = os.path.join(t1_dir, "manifest.csv")
-        import csv as _csv
-        with open(t1_manifest, "w", newline="", encoding="utf-8") as f:
-            wcsv = _csv.writer(f)
-            # خليه generic: نفس أعمدة الـ GUI (تستخدم t1_path كاسم عمود افتراضي)
-            wcsv.writerow(["scene_id", "tile_x", "tile_y", "x0", "y0", "w", "h", "t1_path", "label_path", "fold"])
-            wcsv.writerows(rows_t1)
-
-        if write_parquet:
-            try:
-                import pandas as pd
-                cols = ["scene_id","tile_x","tile_y","x0","y0","w","h","t1_path","label_path","fold"]
-                pd.DataFrame(rows_t1, columns=cols).to_parquet(
-                    os.path.join(t1_dir, "manifest.parquet"), index=False
-                )
-            except Exception:
-                pass
-
-    if write_manifest and t2_used and rows_t2:
-        t2_manifest = os.path.join(t2_dir, "manifest.csv")
-        import csv as _csv
-        with open(t2_manifest, "w", newline="", encoding="utf-8") as f:
-            wcsv = _csv.writer(f)
-            # للوضوح نكتب t2_path؛ والـ GUI بيتعامل مع أي اسم عمود (t1_path/t2_path/path)
-            wcsv.writerow(["scene_id", "tile_x", "tile_y", "x0", "y0", "w", "h", "t2_path", "label_path", "fold"])
-            wcsv.writerows(rows_t2)
-
-        if write_parquet:
-            try:
-                import pandas as pd
-                cols = ["scene_id","tile_x","tile_y","x0","y0","w","h","t2_path","label_path","fold"]
-                pd.DataFrame(rows_t2, columns=cols).to_parquet(
-                    os.path.join(t2_dir, "manifest.parquet"), index=False
-                )
-            except Exception:
-                pass
+        # also on cancel / error: the rows written so far match the tiles on disk
+        t1_manifest = man1.close() if man1 is not None else None
+        t2_manifest = man2.close() if man2 is not None else None
 
     result: Dict[str, Any] = {
         "tiles": tiles,
@@ -374,7 +1237,11 @@ def split_large_image(
         "t1_manifest": t1_manifest or "",
         "t2_manifest": t2_manifest or "",
         "t2_used": bool(t2_used),
+        "skipped": skipped,
     }
+    if t2_same:
+        same_note = "T2 is the same file as the input; T2 tiles are links to the T1 tiles."
+        info_note = f"{info_note}\n{same_note}" if info_note else same_note
     if info_note:
         result["note"] = info_note
     return result
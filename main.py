@@ -1,4 +1,4 @@
 from app.gui import run_app
 
 if __name__ == "__main__":
-    run_app()
+    raise SystemExit(run_app())